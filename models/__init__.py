@@ -1,20 +1,35 @@
 """
 Model handlers package for LLM Playground Backend
 Contains handlers for different AI model providers.
+
+Handlers are imported lazily on first attribute access, so a deployment
+that only uses one provider never loads the others.
 """
 
-from .base_handler import BaseHandler
-from .openai_handler import OpenAIHandler
-from .anthropic_handler import AnthropicHandler
-from .google_handler import GoogleHandler
-from .groq_handler import GroqHandler
-from .huggingface_handler import HuggingFaceHandler
+import importlib
+
+_MODULES = {
+    'BaseHandler': '.base_handler',
+    'OpenAIHandler': '.openai_handler',
+    'AnthropicHandler': '.anthropic_handler',
+    'GoogleHandler': '.google_handler',
+    'GroqHandler': '.groq_handler',
+    'HuggingFaceHandler': '.huggingface_handler',
+    'CacheBackend': '.cache',
+    'LLMCache': '.cache',
+    'SemanticCache': '.semantic_cache'
+}
+
+__all__ = list(_MODULES)
+
+def __getattr__(name):
+    module_name = _MODULES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    # Cache on the package so later lookups skip __getattr__ entirely
+    globals()[name] = value
+    return value
 
-__all__ = [
-    'BaseHandler',
-    'OpenAIHandler',
-    'AnthropicHandler',
-    'GoogleHandler',
-    'GroqHandler',
-    'HuggingFaceHandler'
-]
\ No newline at end of file
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -3,129 +3,172 @@ Anthropic API handler for Claude models
 Handles communication with Anthropic's API endpoints.
 """
 
+import time
+import orjson
 import requests
-import json
-from typing import Dict, Any, List
+from types import MappingProxyType
+from typing import Dict, Any, List, Optional, Tuple
 from .base_handler import BaseHandler
 
 class AnthropicHandler(BaseHandler):
     """Handler for Anthropic Claude models"""
     
+    api_name = 'Anthropic'
+    
+    MAX_TOKENS_CAP = 8192  # Anthropic limit
+    # Anthropic doesn't support presence_penalty, frequency_penalty, or seed
+    UNSUPPORTED_PARAMS = frozenset({'presence_penalty', 'frequency_penalty', 'seed'})
+    
+    MODEL_MAPPING = MappingProxyType({
+        'claude-3-5-sonnet': 'claude-3-5-sonnet-20241022',
+        'claude-3-5-haiku': 'claude-3-5-haiku-20241022',
+        'claude-3-opus': 'claude-3-opus-20240229',
+        'claude-3-haiku': 'claude-3-haiku-20240307'
+    })
+    
     def __init__(self, api_key: str):
         super().__init__(api_key)
         self.base_url = "https://api.anthropic.com/v1"
-        self.model_mapping = {
-            'claude-3-5-sonnet': 'claude-3-5-sonnet-20241022',
-            'claude-3-5-haiku': 'claude-3-5-haiku-20241022',
-            'claude-3-opus': 'claude-3-opus-20240229',
-            'claude-3-haiku': 'claude-3-haiku-20240307'
+        self._messages_url = f"{self.base_url}/messages"
+        self._batches_url = f"{self.base_url}/messages/batches"
+    
+    def _default_headers(self) -> Dict[str, str]:
+        """Static headers sent with every Anthropic request"""
+        return {
+            'x-api-key': self.api_key,
+            'Content-Type': 'application/json',
+            'anthropic-version': '2023-06-01'
         }
     
-    def generate_response(
+    def _prepare_request(
         self, 
         model: str, 
         message: str, 
         settings: Dict[str, Any], 
-        conversation_history: List[Dict[str, str]]
-    ) -> str:
-        """Generate response using Anthropic API"""
+        conversation_history: List[Dict[str, str]],
+        session_id: Optional[str] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Build the messages request for Anthropic API"""
+        # Get the actual model name for Anthropic API
+        api_model = self.MODEL_MAPPING.get(model, model)
+        
+        # Format messages for Anthropic (they use a different format)
+        messages = self._format_anthropic_messages(
+            conversation_history, 
+            message,
+            session_id
+        )
+        
+        # Prepare request payload
+        payload = {
+            'model': api_model,
+            'messages': messages,
+            'max_tokens': settings.get('max_tokens', 2048),
+            'temperature': settings.get('temperature', 0.7),
+            'top_p': settings.get('top_p', 1.0)
+        }
+        
+        # Add system prompt if provided, marked cacheable so the prompt prefix
+        # is reused server-side across turns
+        system_prompt = settings.get('system_prompt')
+        if system_prompt:
+            payload['system'] = [{
+                'type': 'text',
+                'text': system_prompt,
+                'cache_control': {'type': 'ephemeral'}
+            }]
+        
+        # Add stop sequences if provided
+        if 'stop' in settings:
+            payload['stop_sequences'] = settings['stop']
+        
+        return self._messages_url, payload
+    
+    def _parse_response(self, data: Dict[str, Any]) -> str:
+        """Extract the completion text from an Anthropic response"""
+        return data['content'][0]['text']
+    
+    def _parse_stream_event(self, event: Dict[str, Any]) -> Optional[str]:
+        """Extract the text delta from an Anthropic streaming event"""
+        event_type = event.get('type')
+        if event_type == 'content_block_delta':
+            return event.get('delta', {}).get('text')
+        elif event_type == 'error':
+            raise Exception(f"Anthropic API error: {event.get('error', {}).get('message')}")
+        return None
+    
+    def generate_batch(
+        self, 
+        model: str, 
+        messages: List[str], 
+        settings: Dict[str, Any],
+        poll_interval: float = 10.0
+    ) -> List[str]:
+        """
+        Generate responses for several messages via the Message Batches API
+        
+        Batches are billed at a discount but processed asynchronously: the
+        batch is submitted, polled every poll_interval seconds until it ends
+        (which can take minutes to hours), then its results are collected.
+        Returns one response per message, in order.
+        """
         try:
             # Validate and normalize settings
             validated_settings = self.validate_settings(settings)
             
-            # Get the actual model name for Anthropic API
-            api_model = self.model_mapping.get(model, model)
-            
-            # Format messages for Anthropic (they use a different format)
-            messages = self._format_anthropic_messages(
-                conversation_history, 
-                message
-            )
-            
-            # Prepare request payload
-            payload = {
-                'model': api_model,
-                'messages': messages,
-                'max_tokens': validated_settings.get('max_tokens', 2048),
-                'temperature': validated_settings.get('temperature', 0.7),
-                'top_p': validated_settings.get('top_p', 1.0)
-            }
+            batch_requests = []
+            for index, message in enumerate(messages):
+                _, params = self._prepare_request(model, message, validated_settings, [])
+                batch_requests.append({'custom_id': f'request-{index}', 'params': params})
             
-            # Add system prompt if provided
-            system_prompt = validated_settings.get('system_prompt')
-            if system_prompt:
-                payload['system'] = system_prompt
+            batch = self._post_json(self._batches_url, {'requests': batch_requests})
             
-            # Add stop sequences if provided
-            if 'stop' in validated_settings:
-                payload['stop_sequences'] = validated_settings['stop']
+            # Poll until processing has ended
+            while batch['processing_status'] != 'ended':
+                time.sleep(poll_interval)
+                response = self.session.get(
+                    f"{self._batches_url}/{batch['id']}",
+                    timeout=self._timeout
+                )
+                response.raise_for_status()
+                batch = orjson.loads(response.content)
             
-            # Make API request
-            headers = {
-                'x-api-key': self.api_key,
-                'Content-Type': 'application/json',
-                'anthropic-version': '2023-06-01'
-            }
+            # Results are JSONL, one line per request, in no guaranteed order
+            response = self.session.get(batch['results_url'], timeout=self._timeout)
+            response.raise_for_status()
+            results = {}
+            for line in response.content.splitlines():
+                if not line.strip():
+                    continue
+                entry = orjson.loads(line)
+                result = entry['result']
+                if result['type'] == 'succeeded':
+                    results[entry['custom_id']] = self._parse_response(result['message'])
+                else:
+                    error = result.get('error', {}).get('message', result['type'])
+                    results[entry['custom_id']] = f"Error from {self.provider_name}: {error}"
             
-            response = requests.post(
-                f"{self.base_url}/messages",
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                return data['content'][0]['text']
-            else:
-                error_data = response.json()
-                error_msg = error_data.get('error', {}).get('message', f'HTTP {response.status_code}')
-                raise Exception(f"Anthropic API error: {error_msg}")
+            return [results.get(f'request-{index}', f"Error from {self.provider_name}: missing result")
+                    for index in range(len(messages))]
                         
         except requests.exceptions.Timeout:
-            return self.handle_error(Exception("Request timeout"), "API call")
+            return [self.handle_error(Exception("Request timeout"), "API call")] * len(messages)
         except requests.exceptions.RequestException as e:
-            return self.handle_error(e, "network request")
-        except json.JSONDecodeError as e:
-            return self.handle_error(e, "response parsing")
+            return [self.handle_error(e, "network request")] * len(messages)
+        except orjson.JSONDecodeError as e:
+            return [self.handle_error(e, "response parsing")] * len(messages)
         except Exception as e:
-            return self.handle_error(e, "generate_response")
+            return [self.handle_error(e, "generate_batch")] * len(messages)
     
     def _format_anthropic_messages(
         self, 
         conversation_history: List[Dict[str, str]], 
-        current_message: str
+        current_message: str,
+        session_id: Optional[str] = None
     ) -> List[Dict[str, str]]:
         """Format messages for Anthropic API (no system role in messages)"""
-        messages = []
-        
-        # Add conversation history
-        for msg in conversation_history:
-            role = msg.get('sender', 'user')
-            content = msg.get('content', '')
-            
-            # Anthropic uses 'user' and 'assistant' roles
-            if role == 'user':
-                messages.append({'role': 'user', 'content': content})
-            elif role == 'assistant' or role == 'bot':
-                messages.append({'role': 'assistant', 'content': content})
-        
-        # Add current message
-        messages.append({'role': 'user', 'content': current_message})
-        
-        return messages
-    
-    def validate_settings(self, settings: Dict[str, Any]) -> Dict[str, Any]:
-        """Validate settings specific to Anthropic models"""
-        validated = super().validate_settings(settings)
-        
-        # Anthropic-specific max tokens limits
-        max_tokens = validated.get('max_tokens', 2048)
-        validated['max_tokens'] = min(max_tokens, 8192)  # Anthropic limit
-        
-        # Anthropic doesn't support presence_penalty and frequency_penalty
-        validated.pop('presence_penalty', None)
-        validated.pop('frequency_penalty', None)
-        validated.pop('seed', None)  # Anthropic doesn't support seed
-        
-        return validated
\ No newline at end of file
+        # Anthropic uses 'user' and 'assistant' roles, same as the base format
+        return [
+            *self._formatted_history(conversation_history, session_id),
+            {'role': 'user', 'content': current_message}
+        ]
\ No newline at end of file
@@ -4,25 +4,338 @@ Defines the common interface and shared functionality.
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
+import asyncio
+import functools
+import hashlib
 import logging
+import os
+import random
+import re
+import threading
+import time
+import weakref
+
+import aiohttp
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .cache import CacheBackend, LLMCache
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .rate_limit import RateLimiter
+from .sse import aiter_sse_data, iter_sse_data
 
 logger = logging.getLogger(__name__)
 
+# Shared worker pool for generate_responses_parallel; provider calls are
+# I/O-bound and release the GIL while waiting on the socket
+_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv('LLM_MAX_WORKERS', '16')),
+    thread_name_prefix='llm-worker'
+)
+
+# Numeric settings clamped into range:
+# (frontend key, validated key, default, type, minimum, maximum)
+_NUMERIC_SETTINGS = (
+    ('temperature', 'temperature', 0.7, float, 0.0, 2.0),
+    ('maxTokens', 'max_tokens', 2048, int, 1, 4096),  # model-dependent, capped again per provider
+    ('topP', 'top_p', 1.0, float, 0.0, 1.0),
+    ('presencePenalty', 'presence_penalty', 0.0, float, -2.0, 2.0),
+    ('frequencyPenalty', 'frequency_penalty', 0.0, float, -2.0, 2.0),
+)
+
+def _normalize_settings(settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate and normalize raw frontend settings (see BaseHandler.validate_settings)"""
+    validated = {}
+    
+    for key, validated_key, default, cast, minimum, maximum in _NUMERIC_SETTINGS:
+        validated[validated_key] = max(minimum, min(maximum, cast(settings.get(key, default))))
+    
+    # Stop sequences
+    stop_sequence = settings.get('stopSequence', '')
+    if stop_sequence and stop_sequence.strip():
+        validated['stop'] = [s.strip() for s in stop_sequence.split(',') if s.strip()]
+    
+    # System prompt
+    system_prompt = settings.get('systemPrompt', '')
+    if system_prompt and system_prompt.strip():
+        validated['system_prompt'] = system_prompt.strip()
+    
+    # Seed (for reproducibility)
+    seed = settings.get('seed')
+    if seed is not None and str(seed).strip():
+        try:
+            validated['seed'] = int(seed)
+        except (ValueError, TypeError):
+            pass  # Ignore invalid seed values
+    
+    return validated
+
+# Error classification for handle_error: one case-insensitive pass over the
+# message, then a table lookup for the user-facing text
+_ERROR_CLASSIFIER = re.compile(r'rate limit|api key|unauthorized|quota|billing|circuit open', re.IGNORECASE)
+_ERROR_CATEGORY = {
+    'circuit open': 'unavailable',
+    'rate limit': 'rate',
+    'api key': 'auth',
+    'unauthorized': 'auth',
+    'quota': 'billing',
+    'billing': 'billing'
+}
+_ERROR_TEMPLATES = {
+    'rate': "Rate limit exceeded for {provider}. Please try again later.",
+    'auth': "Authentication failed for {provider}. Please check your API key.",
+    'billing': "Quota exceeded for {provider}. Please check your billing status.",
+    'unavailable': "{provider} is temporarily unavailable after repeated failures. Please try again shortly.",
+    'generic': "Error from {provider}: {error}"
+}
+
+# Transient upstream statuses retried with exponential backoff
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Messages answered locally when greeting short-circuiting is enabled
+_GREETINGS = frozenset({
+    'hi', 'hello', 'hey', 'hiya', 'yo', 'howdy', 'greetings',
+    'good morning', 'good afternoon', 'good evening'
+})
+
+@functools.lru_cache(maxsize=1024)
+def _normalize_settings_cached(items: Tuple[Tuple[str, Any], ...]) -> Dict[str, Any]:
+    """Memoized _normalize_settings keyed on the sorted settings items"""
+    return _normalize_settings(dict(items))
+
 class BaseHandler(ABC):
-    """Abstract base class for all model handlers"""
+    """
+    Abstract base class for all model handlers
+    
+    The system prompt is sent first and must stay byte-identical across a
+    session so provider prompt-prefix caching (Anthropic cache_control,
+    OpenAI automatic prefix caching) keeps hitting. Anything that varies
+    per request belongs in dynamic_context, which is placed after the
+    system prompt and before the conversation history.
+    """
+    
+    # Provider label used in upstream error messages ("<api_name> API error: ...")
+    api_name = 'LLM'
+    
+    # Retries for rate-limited (429) or failing (5xx) calls, and the base delay
+    # in seconds; Retry-After is honored when the provider sends it
+    max_retries = 5
+    retry_backoff = 0.5
+    
+    # Seconds allowed to open a connection (a dead host fails fast) and to
+    # wait for the next bytes of a response (long generations still finish);
+    # override per provider with e.g. OPENAI_CONNECT_TIMEOUT / OPENAI_READ_TIMEOUT
+    connect_timeout = 3.05
+    read_timeout = 120.0
+    
+    # Upper bound on in-flight requests issued by abatch()
+    max_concurrency = 8
+    
+    # Keep-alive pool shared by every call to the provider: number of hosts
+    # pooled, sockets kept per host, and seconds an idle socket is kept open
+    # so consecutive chat turns skip the TCP+TLS handshake
+    pool_connections = 32
+    pool_maxsize = 64
+    keepalive_timeout = 60
+    
+    # Provider limit on max_tokens, and validated settings it rejects
+    MAX_TOKENS_CAP = 4096
+    UNSUPPORTED_PARAMS = frozenset()
+    
+    # Frontend sender -> provider role; senders not listed are dropped
+    ROLE_MAP = {'user': 'user', 'assistant': 'assistant', 'bot': 'assistant'}
+    
+    # Answer a bare opening greeting locally instead of calling the provider.
+    # Off by default: the playground exists to see what the model says.
+    short_circuit_greetings = os.getenv('LLM_SHORT_CIRCUIT_GREETINGS', 'False').lower() == 'true'
+    
+    # Consecutive transient failures (timeouts, connection errors, 429/5xx
+    # after retries) that open the circuit, and seconds before a probe call
+    circuit_fail_max = 5
+    circuit_reset_timeout = 30.0
+    
+    # Number of sessions whose formatted history prefix is kept per handler
+    history_cache_size = 256
+    
+    # Exact-match response cache shared by all handlers; assign another
+    # CacheBackend (e.g. Redis-backed) to share it across processes
+    cache: CacheBackend = LLMCache()
+    
+    # Optional paraphrase-tolerant cache (models.semantic_cache.SemanticCache)
+    # consulted after an exact-cache miss; None disables it
+    semantic_cache = None
     
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.provider_name = self.__class__.__name__.replace('Handler', '').lower()
+        self._headers = self._default_headers()
+        env_prefix = self.provider_name.upper()
+        self.connect_timeout = float(os.getenv(f'{env_prefix}_CONNECT_TIMEOUT', self.connect_timeout))
+        self.read_timeout = float(os.getenv(f'{env_prefix}_READ_TIMEOUT', self.read_timeout))
+        self._timeout = (self.connect_timeout, self.read_timeout)
+        self.session = self._create_session()
+        # Optional requests-per-minute ceiling applied to every provider call, e.g. OPENAI_MAX_RPM=500
+        max_rpm = int(os.getenv(f'{env_prefix}_MAX_RPM', '0'))
+        self.rate_limiter = RateLimiter(max_rpm) if max_rpm > 0 else None
+        self.circuit_breaker = CircuitBreaker(self.circuit_fail_max, self.circuit_reset_timeout)
+        # session_id -> (raw history messages, formatted history)
+        self._history_cache = OrderedDict()
+        self._history_lock = threading.Lock()
+        # aiohttp sessions are bound to the event loop that created them
+        self._async_sessions = weakref.WeakKeyDictionary()
         
     @abstractmethod
-    def generate_response(
+    def _prepare_request(
         self, 
         model: str, 
         message: str, 
         settings: Dict[str, Any], 
+        conversation_history: List[Dict[str, str]],
+        session_id: Optional[str] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build the provider-specific HTTP request
+        
+        Args:
+            model: The specific model to use
+            message: The user's message
+            settings: Validated settings (output of validate_settings)
+            conversation_history: Previous conversation messages
+            session_id: Optional conversation identifier (see _formatted_history)
+            
+        Returns:
+            Tuple of (url, payload)
+        """
+        pass
+    
+    def _default_headers(self) -> Dict[str, str]:
+        """Static headers sent with every request (auth, content type, API version)"""
+        return {'Content-Type': 'application/json'}
+    
+    @abstractmethod
+    def _parse_response(self, data: Any) -> str:
+        """Extract the generated text from a successful API response body"""
+        pass
+    
+    def _parse_error(self, data: Any, status_code: int) -> str:
+        """Extract the error message from a failed API response body"""
+        return data.get('error', {}).get('message', f'HTTP {status_code}')
+    
+    def _direct_response(
+        self, 
+        message: str, 
         conversation_history: List[Dict[str, str]]
+    ) -> Optional[str]:
+        """Return a canned reply for messages that don't need a model call, else None"""
+        text = message.strip()
+        if not text:
+            return "Please enter a message."
+        
+        if (
+            self.short_circuit_greetings
+            and not conversation_history
+            and text.lower().rstrip('!.') in _GREETINGS
+        ):
+            return "Hello! How can I help you today?"
+        
+        return None
+    
+    def _cache_key(self, url: str, payload: Dict[str, Any], settings: Dict[str, Any]) -> Optional[str]:
+        """
+        Build the response cache key for a request
+        
+        Only deterministic calls (temperature 0 or an explicit seed) are
+        cacheable; for anything else None is returned.
+        """
+        if settings.get('temperature', 0.7) > 0 and 'seed' not in settings:
+            return None
+        
+        raw = orjson.dumps(
+            {'provider': self.provider_name, 'url': url, 'payload': payload},
+            option=orjson.OPT_SORT_KEYS
+        )
+        return hashlib.sha256(raw).hexdigest()
+    
+    def _semantic_lookup(
+        self,
+        model: str,
+        message: str,
+        settings: Dict[str, Any],
+        conversation_history: List[Dict[str, str]],
+        session_id: Optional[str] = None
+    ) -> Tuple[Optional[str], Optional[Tuple[str, Any]]]:
+        """
+        Consult the semantic cache for a paraphrase of message
+        
+        Returns (cached response or None, entry); the entry is passed to
+        semantic_cache.add once the provider has answered. Everything but the
+        user message goes into the namespace, so only the wording may differ.
+        History is hashed as the provider will see it, not as the client sent
+        it, so per-message extras such as frontend timestamps don't matter.
+        """
+        raw = orjson.dumps(
+            {
+                'provider': self.provider_name,
+                'model': model,
+                'settings': settings,
+                'history': self._formatted_history(conversation_history, session_id)
+            },
+            option=orjson.OPT_SORT_KEYS
+        )
+        namespace = hashlib.sha256(raw).hexdigest()
+        cached, embedding = self.semantic_cache.lookup(namespace, message)
+        return cached, (namespace, embedding)
+    
+    def _error_message(self, body: bytes, status_code: int) -> str:
+        """
+        Error message for a failed response body
+        
+        Upstream outages often return HTML or plain text (proxy 502 pages),
+        so a body that isn't JSON is reported as its first 500 bytes rather
+        than masking the status code with a parse error.
+        """
+        try:
+            data = orjson.loads(body)
+        except orjson.JSONDecodeError:
+            text = body[:500].decode('utf-8', errors='replace').strip()
+            return f"HTTP {status_code}: {text}" if text else f"HTTP {status_code}"
+        
+        if not isinstance(data, dict):
+            return f"HTTP {status_code}"
+        return self._parse_error(data, status_code)
+    
+    def _prepare_stream_request(
+        self, 
+        model: str, 
+        message: str, 
+        settings: Dict[str, Any], 
+        conversation_history: List[Dict[str, str]],
+        session_id: Optional[str] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Build the streaming (SSE) variant of the request; returns (url, payload)"""
+        url, payload = self._prepare_request(model, message, settings, conversation_history, session_id)
+        payload['stream'] = True
+        return url, payload
+    
+    @abstractmethod
+    def _parse_stream_event(self, event: Dict[str, Any]) -> Optional[str]:
+        """Extract the text delta from one server-sent event, or None if it carries no text"""
+        pass
+    
+    def generate_response(
+        self, 
+        model: str, 
+        message: str, 
+        settings: Dict[str, Any], 
+        conversation_history: List[Dict[str, str]],
+        dynamic_context: Optional[List[Dict[str, str]]] = None,
+        session_id: Optional[str] = None
     ) -> str:
         """
         Generate response from the AI model
@@ -32,68 +345,471 @@ class BaseHandler(ABC):
             message: The user's message
             settings: Model parameters (temperature, max_tokens, etc.)
             conversation_history: Previous conversation messages
+            dynamic_context: Optional per-request context messages (retrieved
+                memory, user metadata) in the same shape as conversation_history
+            session_id: Optional conversation identifier; lets the handler reuse
+                the formatted history from the previous turn
             
         Returns:
             Generated response string
+            
+        Raises:
+            CircuitOpenError: the provider's circuit breaker rejected the call;
+                every other failure comes back as a user-facing error string
         """
-        pass
+        try:
+            direct = self._direct_response(message, conversation_history)
+            if direct is not None:
+                return direct
+            
+            validated_settings = self.validate_settings(settings)
+            if dynamic_context:
+                conversation_history = [*dynamic_context, *conversation_history]
+            url, payload = self._prepare_request(
+                model, message, validated_settings, conversation_history, session_id
+            )
+            
+            cache_key = self._cache_key(url, payload, validated_settings)
+            semantic_entry = None
+            if cache_key:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
+                if self.semantic_cache is not None:
+                    cached, semantic_entry = self._semantic_lookup(
+                        model, message, validated_settings, conversation_history, session_id
+                    )
+                    if cached is not None:
+                        return cached
+            
+            text = self._parse_response(self._post_json(url, payload))
+            if cache_key:
+                self.cache.set(cache_key, text)
+                if semantic_entry:
+                    self.semantic_cache.add(*semantic_entry, text)
+            return text
+                        
+        except requests.exceptions.Timeout:
+            return self.handle_error(Exception("Request timeout"), "API call")
+        except requests.exceptions.RequestException as e:
+            return self.handle_error(e, "network request")
+        except orjson.JSONDecodeError as e:
+            return self.handle_error(e, "response parsing")
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            return self.handle_error(e, "generate_response")
     
-    def validate_settings(self, settings: Dict[str, Any]) -> Dict[str, Any]:
+    def generate_response_stream(
+        self, 
+        model: str, 
+        message: str, 
+        settings: Dict[str, Any], 
+        conversation_history: List[Dict[str, str]],
+        dynamic_context: Optional[List[Dict[str, str]]] = None,
+        session_id: Optional[str] = None
+    ) -> Iterator[str]:
         """
-        Validate and normalize settings for the model
+        Stream the response from the AI model as it is generated
+        
+        Arguments match generate_response. Yields text deltas in order; on
+        failure a single user-friendly error message is yielded instead.
+        """
+        try:
+            direct = self._direct_response(message, conversation_history)
+            if direct is not None:
+                yield direct
+                return
+            
+            validated_settings = self.validate_settings(settings)
+            if dynamic_context:
+                conversation_history = [*dynamic_context, *conversation_history]
+            url, payload = self._prepare_stream_request(
+                model, message, validated_settings, conversation_history, session_id
+            )
+            
+            with self._send(url, payload, stream=True) as response:
+                if response.status_code != 200:
+                    error_msg = self._error_message(response.content, response.status_code)
+                    raise Exception(f"{self.api_name} API error: {error_msg}")
+                
+                # Frames stay as raw bytes: orjson parses UTF-8 directly, so
+                # only the extracted deltas are ever materialized as str
+                chunks = response.raw.stream(4096, decode_content=True)
+                for data in iter_sse_data(chunks):
+                    if data == b'[DONE]':
+                        break
+                    delta = self._parse_stream_event(orjson.loads(data))
+                    if delta:
+                        yield delta
+                        
+        except requests.exceptions.Timeout:
+            yield self.handle_error(Exception("Request timeout"), "API call")
+        except requests.exceptions.RequestException as e:
+            yield self.handle_error(e, "network request")
+        except orjson.JSONDecodeError as e:
+            yield self.handle_error(e, "response parsing")
+        except Exception as e:
+            yield self.handle_error(e, "generate_response_stream")
+    
+    async def agenerate_response(
+        self, 
+        model: str, 
+        message: str, 
+        settings: Dict[str, Any], 
+        conversation_history: List[Dict[str, str]],
+        dynamic_context: Optional[List[Dict[str, str]]] = None,
+        session_id: Optional[str] = None
+    ) -> str:
+        """
+        Async variant of generate_response
+        
+        Uses a pooled aiohttp session so many calls can be in flight at once
+        (see abatch). Arguments, return value and CircuitOpenError match
+        generate_response.
+        """
+        try:
+            direct = self._direct_response(message, conversation_history)
+            if direct is not None:
+                return direct
+            
+            validated_settings = self.validate_settings(settings)
+            if dynamic_context:
+                conversation_history = [*dynamic_context, *conversation_history]
+            url, payload = self._prepare_request(
+                model, message, validated_settings, conversation_history, session_id
+            )
+            
+            cache_key = self._cache_key(url, payload, validated_settings)
+            semantic_entry = None
+            if cache_key:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
+                if self.semantic_cache is not None:
+                    # Embedding is CPU-bound; keep it off the event loop
+                    cached, semantic_entry = await asyncio.get_running_loop().run_in_executor(
+                        _EXECUTOR, self._semantic_lookup,
+                        model, message, validated_settings, conversation_history, session_id
+                    )
+                    if cached is not None:
+                        return cached
+            
+            status_code, body = await self._apost(url, payload)
+            
+            if status_code == 200:
+                text = self._parse_response(orjson.loads(body))
+                if cache_key:
+                    self.cache.set(cache_key, text)
+                    if semantic_entry:
+                        self.semantic_cache.add(*semantic_entry, text)
+                return text
+            else:
+                error_msg = self._error_message(body, status_code)
+                raise Exception(f"{self.api_name} API error: {error_msg}")
+                        
+        except asyncio.TimeoutError:
+            return self.handle_error(Exception("Request timeout"), "API call")
+        except aiohttp.ClientError as e:
+            return self.handle_error(e, "network request")
+        except orjson.JSONDecodeError as e:
+            return self.handle_error(e, "response parsing")
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            return self.handle_error(e, "agenerate_response")
+    
+    async def agenerate_response_stream(
+        self, 
+        model: str, 
+        message: str, 
+        settings: Dict[str, Any], 
+        conversation_history: List[Dict[str, str]],
+        dynamic_context: Optional[List[Dict[str, str]]] = None,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Async variant of generate_response_stream
+        
+        Reads the provider's event stream over the pooled aiohttp session.
+        Arguments and yielded values match generate_response_stream.
+        """
+        try:
+            direct = self._direct_response(message, conversation_history)
+            if direct is not None:
+                yield direct
+                return
+            
+            validated_settings = self.validate_settings(settings)
+            if dynamic_context:
+                conversation_history = [*dynamic_context, *conversation_history]
+            url, payload = self._prepare_stream_request(
+                model, message, validated_settings, conversation_history, session_id
+            )
+            
+            self._check_circuit()
+            if self.rate_limiter:
+                await self.rate_limiter.aacquire()
+            session = self._get_async_session()
+            try:
+                response = await session.post(url, data=orjson.dumps(payload))
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.circuit_breaker.record_failure()
+                raise
+            self._record_status(response.status)
+            
+            async with response:
+                if response.status != 200:
+                    error_msg = self._error_message(await response.read(), response.status)
+                    raise Exception(f"{self.api_name} API error: {error_msg}")
+                
+                async for data in aiter_sse_data(response.content.iter_any()):
+                    if data == b'[DONE]':
+                        break
+                    delta = self._parse_stream_event(orjson.loads(data))
+                    if delta:
+                        yield delta
+                        
+        except asyncio.TimeoutError:
+            yield self.handle_error(Exception("Request timeout"), "API call")
+        except aiohttp.ClientError as e:
+            yield self.handle_error(e, "network request")
+        except orjson.JSONDecodeError as e:
+            yield self.handle_error(e, "response parsing")
+        except Exception as e:
+            yield self.handle_error(e, "agenerate_response_stream")
+    
+    def generate_responses_parallel(
+        self, 
+        jobs: List[Tuple[str, str, Dict[str, Any], List[Dict[str, str]]]]
+    ) -> List[str]:
+        """
+        Run several generate_response calls concurrently on the shared thread pool
         
         Args:
-            settings: Raw settings from frontend
+            jobs: (model, message, settings, conversation_history) tuples
             
         Returns:
-            Validated and normalized settings
+            Generated responses, in the same order as jobs
+        """
+        return list(_EXECUTOR.map(self._run_job, jobs))
+    
+    def _run_job(self, job: Tuple[str, str, Dict[str, Any], List[Dict[str, str]]]) -> str:
+        """Run one generate_responses_parallel job"""
+        try:
+            return self.generate_response(*job)
+        except CircuitOpenError as e:
+            return self.handle_error(e, "generate_response")
+    
+    async def abatch(
+        self, 
+        model: str, 
+        messages: List[str], 
+        settings: Dict[str, Any], 
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        max_concurrency: Optional[int] = None
+    ) -> List[str]:
         """
-        validated = {}
+        Generate responses for several messages concurrently
         
-        # Temperature (0.0 to 2.0)
-        temperature = settings.get('temperature', 0.7)
-        validated['temperature'] = max(0.0, min(2.0, float(temperature)))
+        Args:
+            model: The specific model to use
+            messages: User messages, each sent as an independent request
+            settings: Model parameters shared by every request
+            conversation_history: Optional history shared by every request
+            max_concurrency: Cap on simultaneous requests (defaults to max_concurrency)
+            
+        Returns:
+            Generated responses, in the same order as messages
+        """
+        history = conversation_history or []
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
         
-        # Max tokens (1 to 4096, model-dependent)
-        max_tokens = settings.get('maxTokens', 2048)
-        validated['max_tokens'] = max(1, min(4096, int(max_tokens)))
+        async def run(message: str) -> str:
+            async with semaphore:
+                try:
+                    return await self.agenerate_response(model, message, settings, history)
+                except CircuitOpenError as e:
+                    return self.handle_error(e, "agenerate_response")
         
-        # Top P (0.0 to 1.0)
-        top_p = settings.get('topP', 1.0)
-        validated['top_p'] = max(0.0, min(1.0, float(top_p)))
+        return await asyncio.gather(*(run(message) for message in messages))
+    
+    def _post_json(self, url: str, payload: Any) -> Any:
+        """POST a JSON payload and return the decoded body, raising on a non-200 status"""
+        response = self._send(url, payload)
         
-        # Presence penalty (-2.0 to 2.0)
-        presence_penalty = settings.get('presencePenalty', 0.0)
-        validated['presence_penalty'] = max(-2.0, min(2.0, float(presence_penalty)))
+        body = response.content
+        if response.status_code == 200:
+            return orjson.loads(body)
+        else:
+            error_msg = self._error_message(body, response.status_code)
+            raise Exception(f"{self.api_name} API error: {error_msg}")
+    
+    def _send(self, url: str, payload: Any, stream: bool = False) -> requests.Response:
+        """POST a JSON payload through the circuit breaker and rate limit and return the response"""
+        self._check_circuit()
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        try:
+            response = self.session.post(
+                url,
+                data=orjson.dumps(payload),
+                stream=stream,
+                timeout=self._timeout
+            )
+        except requests.exceptions.RequestException:
+            self.circuit_breaker.record_failure()
+            raise
+        self._record_status(response.status_code)
+        return response
+    
+    async def _apost(self, url: str, payload: Any) -> Tuple[int, bytes]:
+        """POST a JSON payload asynchronously, retrying transient failures; returns (status, body)"""
+        self._check_circuit()
+        if self.rate_limiter:
+            await self.rate_limiter.aacquire()
+        try:
+            status_code, body = await self._apost_with_retries(url, payload)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.circuit_breaker.record_failure()
+            raise
+        self._record_status(status_code)
+        return status_code, body
+    
+    async def _apost_with_retries(self, url: str, payload: Any) -> Tuple[int, bytes]:
+        """Retry loop behind _apost"""
+        session = self._get_async_session()
+        data = orjson.dumps(payload)
         
-        # Frequency penalty (-2.0 to 2.0)
-        frequency_penalty = settings.get('frequencyPenalty', 0.0)
-        validated['frequency_penalty'] = max(-2.0, min(2.0, float(frequency_penalty)))
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with session.post(url, data=data) as response:
+                    status_code = response.status
+                    body = await response.read()
+                    retry_after = response.headers.get('Retry-After')
+            except (aiohttp.ClientConnectorError, aiohttp.ServerDisconnectedError):
+                # Refused connections and keep-alive sockets closed by the
+                # provider never reached the model, so they are safe to resend
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if status_code not in _RETRY_STATUSES or attempt == self.max_retries:
+                    return status_code, body
+            
+            await asyncio.sleep(self._retry_delay(attempt, retry_after))
+    
+    def _check_circuit(self) -> None:
+        """Raise CircuitOpenError instead of calling a provider that keeps failing"""
+        if not self.circuit_breaker.allow():
+            raise CircuitOpenError(f"{self.api_name} circuit open")
+    
+    def _record_status(self, status_code: int) -> None:
+        """Feed a final response status to the circuit breaker"""
+        if status_code in _RETRY_STATUSES:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+    
+    def _retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Seconds to wait before retry number attempt + 1"""
+        if retry_after:
+            # Retry-After is either delta-seconds or an HTTP date
+            if retry_after.isdigit():
+                return min(float(retry_after), 30.0)
+            try:
+                wait = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                pass
+            else:
+                return min(max(wait, 0.0), 30.0)
+        return min(self.retry_backoff * 2 ** attempt * (1 + random.random()), 30.0)
+    
+    def _create_session(self) -> requests.Session:
+        """Create the pooled keep-alive session used for synchronous requests"""
+        session = requests.Session()
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=self.retry_backoff,
+            backoff_jitter=self.retry_backoff,
+            connect=1,  # a host that will not accept connections trips the circuit breaker instead
+            read=False,  # never resend a generation after a read timeout; surface it as a timeout
+            status_forcelist=sorted(_RETRY_STATUSES),
+            allowed_methods=frozenset(['GET', 'POST']),
+            respect_retry_after_header=True,
+            raise_on_status=False  # hand the final response to the normal error path
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(self._headers)
+        return session
+    
+    def _get_async_session(self) -> aiohttp.ClientSession:
+        """Return the aiohttp session for the running event loop, creating it lazily"""
+        loop = asyncio.get_running_loop()
+        session = self._async_sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_maxsize,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self._headers,
+                # No total deadline: a long generation is fine as long as
+                # bytes keep arriving within read_timeout
+                timeout=aiohttp.ClientTimeout(
+                    total=None,
+                    sock_connect=self.connect_timeout,
+                    sock_read=self.read_timeout
+                )
+            )
+            self._async_sessions[loop] = session
+        return session
+    
+    async def aclose(self) -> None:
+        """Close the aiohttp session bound to the running event loop"""
+        session = self._async_sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+    
+    def validate_settings(self, settings: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate and normalize settings for the model
         
-        # Stop sequences
-        stop_sequence = settings.get('stopSequence', '')
-        if stop_sequence and stop_sequence.strip():
-            validated['stop'] = [s.strip() for s in stop_sequence.split(',') if s.strip()]
+        Args:
+            settings: Raw settings from frontend
+            
+        Returns:
+            Validated and normalized settings
+        """
+        try:
+            validated = _normalize_settings_cached(tuple(sorted(settings.items())))
+        except TypeError:
+            # Unhashable values (e.g. lists) can't be memoized; validate directly
+            validated = _normalize_settings(settings)
         
-        # System prompt
-        system_prompt = settings.get('systemPrompt', '')
-        if system_prompt and system_prompt.strip():
-            validated['system_prompt'] = system_prompt.strip()
+        # Copy before the provider adjustments so the cached dict stays pristine
+        validated = dict(validated)
         
-        # Seed (for reproducibility)
-        seed = settings.get('seed')
-        if seed is not None and str(seed).strip():
-            try:
-                validated['seed'] = int(seed)
-            except (ValueError, TypeError):
-                pass  # Ignore invalid seed values
+        # Provider-specific max tokens limit and unsupported parameters
+        validated['max_tokens'] = min(validated['max_tokens'], self.MAX_TOKENS_CAP)
+        for param in self.UNSUPPORTED_PARAMS:
+            validated.pop(param, None)
         
         return validated
     
     def format_conversation_history(
         self, 
         conversation_history: List[Dict[str, str]], 
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        session_id: Optional[str] = None
     ) -> List[Dict[str, str]]:
         """
         Format conversation history for the specific provider
@@ -101,31 +817,91 @@ class BaseHandler(ABC):
         Args:
             conversation_history: List of message dictionaries
             system_prompt: Optional system prompt to include
+            session_id: Optional conversation identifier (see _formatted_history)
             
         Returns:
             Formatted conversation history
         """
-        messages = []
+        history = self._formatted_history(conversation_history, session_id)
         
         # Add system prompt if provided
         if system_prompt:
-            messages.append({
-                'role': 'system',
-                'content': system_prompt
-            })
+            return [{'role': 'system', 'content': system_prompt}, *history]
+        return list(history)
+    
+    def _chat_messages(
+        self, 
+        conversation_history: List[Dict[str, str]], 
+        message: str,
+        system_prompt: Optional[str] = None,
+        session_id: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Complete chat message list: optional system prompt, history, then the
+        new user turn, built in one pass over the cached history prefix
+        """
+        history = self._formatted_history(conversation_history, session_id)
+        user_turn = {'role': 'user', 'content': message}
+        if system_prompt:
+            return [{'role': 'system', 'content': system_prompt}, *history, user_turn]
+        return [*history, user_turn]
+    
+    def _format_history_message(self, msg: Dict[str, str]) -> Optional[Any]:
+        """Convert one conversation message to the provider format, or None to drop it"""
+        role = self.ROLE_MAP.get(msg.get('sender', 'user'))
+        if role:
+            return {'role': role, 'content': msg.get('content', '')}
+        return None
+    
+    def _format_history_messages(self, conversation_history: List[Dict[str, str]]) -> List[Any]:
+        """Convert a run of conversation messages, dropping unknown roles"""
+        return [
+            item for item in map(self._format_history_message, conversation_history)
+            if item is not None
+        ]
+    
+    def _formatted_history(
+        self, 
+        conversation_history: List[Dict[str, str]], 
+        session_id: Optional[str] = None
+    ) -> List[Any]:
+        """
+        Provider-formatted conversation history, reusing the previous turn's work
         
-        # Add conversation history
-        for msg in conversation_history:
-            role = msg.get('sender', 'user')
-            content = msg.get('content', '')
-            
-            # Normalize role names
-            if role == 'user':
-                messages.append({'role': 'user', 'content': content})
-            elif role == 'assistant' or role == 'bot':
-                messages.append({'role': 'assistant', 'content': content})
+        The formatted prefix from the session's last call is reused when every
+        message of that call's history is still there unchanged, and only
+        messages added since are formatted. Without a session_id nothing is
+        memoized: handlers are shared by every client, and no other key
+        identifies a conversation. The returned list is shared with the
+        cache and must not be mutated.
+        """
+        count = len(conversation_history)
+        if not count:
+            return []
+        
+        if session_id is None:
+            return self._format_history_messages(conversation_history)
+        
+        with self._history_lock:
+            entry = self._history_cache.get(session_id)
         
-        return messages
+        # Compare the whole cached prefix: a reused or stale session_id must
+        # never splice another conversation's turns into this one
+        cached_count = len(entry[0]) if entry is not None else 0
+        if cached_count and cached_count <= count and conversation_history[:cached_count] == entry[0]:
+            formatted = entry[1]
+            if cached_count < count:
+                formatted = formatted + self._format_history_messages(conversation_history[cached_count:])
+        else:
+            formatted = self._format_history_messages(conversation_history)
+        
+        with self._history_lock:
+            self._history_cache[session_id] = (list(conversation_history), formatted)
+            self._history_cache.move_to_end(session_id)
+            while len(self._history_cache) > self.history_cache_size:
+                self._history_cache.popitem(last=False)
+        
+        return formatted
     
     def handle_error(self, error: Exception, context: str = "") -> str:
         """
@@ -139,19 +915,9 @@ class BaseHandler(ABC):
             User-friendly error message
         """
         error_msg = str(error)
-        log_msg = f"{self.provider_name} error"
-        if context:
-            log_msg += f" in {context}"
-        log_msg += f": {error_msg}"
-        
-        logger.error(log_msg)
+        logger.error("%s error in %s: %s", self.provider_name, context or "handler", error_msg)
         
         # Return user-friendly error message
-        if "rate limit" in error_msg.lower():
-            return f"Rate limit exceeded for {self.provider_name}. Please try again later."
-        elif "api key" in error_msg.lower() or "unauthorized" in error_msg.lower():
-            return f"Authentication failed for {self.provider_name}. Please check your API key."
-        elif "quota" in error_msg.lower() or "billing" in error_msg.lower():
-            return f"Quota exceeded for {self.provider_name}. Please check your billing status."
-        else:
-            return f"Error from {self.provider_name}: {error_msg}"
\ No newline at end of file
+        match = _ERROR_CLASSIFIER.search(error_msg)
+        category = _ERROR_CATEGORY[match.group().lower()] if match else 'generic'
+        return _ERROR_TEMPLATES[category].format(provider=self.provider_name, error=error_msg)
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""
+Response cache for LLM Playground Backend
+Exact-match cache for deterministic model calls.
+"""
+
+import threading
+from typing import Dict, Optional, Protocol
+
+from cachetools import TTLCache
+
+class CacheBackend(Protocol):
+    """Storage interface for cached responses (in-memory, Redis, file, ...)"""
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on a miss"""
+        ...
+    
+    def set(self, key: str, value: str) -> None:
+        """Store a response under key"""
+        ...
+
+class LLMCache:
+    """Thread-safe in-memory LRU cache whose entries expire after a TTL"""
+    
+    def __init__(self, maxsize: int = 10_000, ttl: float = 3600):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on a miss"""
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+    
+    def set(self, key: str, value: str) -> None:
+        """Store a response under key"""
+        with self._lock:
+            self._cache[key] = value
+    
+    def clear(self) -> None:
+        """Drop every cached response"""
+        with self._lock:
+            self._cache.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size, for monitoring"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._cache)
+            }
@@ -0,0 +1,71 @@
+"""
+Circuit breaker for LLM Playground Backend
+Fast-fails calls to a provider that keeps failing instead of waiting on timeouts.
+"""
+
+import threading
+import time
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the provider's circuit is open"""
+
+class CircuitBreaker:
+    """
+    Thread-safe consecutive-failure circuit breaker
+    
+    Closed: calls pass through. After fail_max consecutive failures the
+    circuit opens and calls are rejected for reset_timeout seconds. It then
+    turns half-open and lets a single probe call through; success closes the
+    circuit again, failure reopens it for another reset_timeout.
+    """
+    
+    def __init__(self, fail_max: int = 5, reset_timeout: float = 30.0):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probe_started = None
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        """'closed', 'open' or 'half_open'"""
+        with self._lock:
+            return self._state()
+    
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return 'open'
+        return 'half_open'
+    
+    def allow(self) -> bool:
+        """Return whether a call may proceed; in half-open state only one probe is admitted"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open':
+                # A probe that never reported back (e.g. a cancelled task)
+                # is replaced once it is older than reset_timeout
+                now = time.monotonic()
+                if self._probe_started is None or now - self._probe_started >= self.reset_timeout:
+                    self._probe_started = now
+                    return True
+            return False
+    
+    def record_success(self) -> None:
+        """Close the circuit and reset the failure count"""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started = None
+    
+    def record_failure(self) -> None:
+        """Count a failure, opening the circuit at fail_max or when a probe fails"""
+        with self._lock:
+            self._failures += 1
+            if self._probe_started is not None or self._failures >= self.fail_max:
+                self._opened_at = time.monotonic()
+                self._probe_started = None
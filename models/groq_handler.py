@@ -3,103 +3,127 @@ Groq API handler for fast inference models
 Handles communication with Groq's API endpoints.
 """
 
+import orjson
 import requests
-import json
-from typing import Dict, Any, List
+from types import MappingProxyType
+from typing import Dict, Any, List, Optional, Tuple
 from .base_handler import BaseHandler
 
 class GroqHandler(BaseHandler):
     """Handler for Groq models (fast inference)"""
     
+    api_name = 'Groq'
+    
+    MAX_TOKENS_CAP = 8192  # Groq limit
+    # Groq doesn't support presence_penalty, frequency_penalty, or seed
+    UNSUPPORTED_PARAMS = frozenset({'presence_penalty', 'frequency_penalty', 'seed'})
+    
+    MODEL_MAPPING = MappingProxyType({
+        'grok-4-fast': 'llama-3.3-70b-versatile',  # Map to available Groq models
+        'grok-4': 'llama-3.1-70b-versatile',
+        'grok-2': 'llama-3.1-8b-instant',
+        'grok-2-mini': 'gemma2-9b-it'
+    })
+    
     def __init__(self, api_key: str):
         super().__init__(api_key)
         self.base_url = "https://api.groq.com/openai/v1"
-        self.model_mapping = {
-            'grok-4-fast': 'llama-3.3-70b-versatile',  # Map to available Groq models
-            'grok-4': 'llama-3.1-70b-versatile',
-            'grok-2': 'llama-3.1-8b-instant',
-            'grok-2-mini': 'gemma2-9b-it'
+        self._chat_url = f"{self.base_url}/chat/completions"
+        self._completions_url = f"{self.base_url}/completions"
+    
+    def _default_headers(self) -> Dict[str, str]:
+        """Static headers sent with every Groq request"""
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
         }
     
-    def generate_response(
+    def _prepare_request(
         self, 
         model: str, 
         message: str, 
         settings: Dict[str, Any], 
-        conversation_history: List[Dict[str, str]]
-    ) -> str:
-        """Generate response using Groq API"""
+        conversation_history: List[Dict[str, str]],
+        session_id: Optional[str] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Build the chat completions request for Groq API"""
+        # Get the actual model name for Groq API
+        api_model = self.MODEL_MAPPING.get(model, 'llama-3.1-70b-versatile')
+        
+        # Format messages, ending with the current one
+        messages = self._chat_messages(
+            conversation_history, 
+            message,
+            settings.get('system_prompt'),
+            session_id
+        )
+        
+        # Prepare request payload
+        payload = {
+            'model': api_model,
+            'messages': messages,
+            'temperature': settings.get('temperature', 0.7),
+            'max_tokens': settings.get('max_tokens', 2048),
+            'top_p': settings.get('top_p', 1.0),
+            'stream': False
+        }
+        
+        # Add optional parameters
+        if 'stop' in settings:
+            payload['stop'] = settings['stop']
+        
+        return self._chat_url, payload
+    
+    def _parse_response(self, data: Dict[str, Any]) -> str:
+        """Extract the completion text from a Groq response"""
+        return data['choices'][0]['message']['content']
+    
+    def _parse_stream_event(self, event: Dict[str, Any]) -> Optional[str]:
+        """Extract the text delta from a Groq streaming chunk"""
+        choices = event.get('choices')
+        if choices:
+            return choices[0].get('delta', {}).get('content')
+        return None
+    
+    def generate_batch(
+        self, 
+        model: str, 
+        messages: List[str], 
+        settings: Dict[str, Any]
+    ) -> List[str]:
+        """
+        Generate completions for several prompts in one request
+        
+        Uses the OpenAI-compatible completions endpoint, which accepts a list
+        of prompts. Returns one response per prompt, in order.
+        """
         try:
             # Validate and normalize settings
             validated_settings = self.validate_settings(settings)
             
             # Get the actual model name for Groq API
-            api_model = self.model_mapping.get(model, 'llama-3.1-70b-versatile')
+            api_model = self.MODEL_MAPPING.get(model, 'llama-3.1-70b-versatile')
             
-            # Format messages
-            messages = self.format_conversation_history(
-                conversation_history, 
-                validated_settings.get('system_prompt')
-            )
-            
-            # Add current message
-            messages.append({'role': 'user', 'content': message})
-            
-            # Prepare request payload
             payload = {
                 'model': api_model,
-                'messages': messages,
+                'prompt': messages,
                 'temperature': validated_settings.get('temperature', 0.7),
                 'max_tokens': validated_settings.get('max_tokens', 2048),
-                'top_p': validated_settings.get('top_p', 1.0),
-                'stream': False
+                'top_p': validated_settings.get('top_p', 1.0)
             }
             
-            # Add optional parameters
             if 'stop' in validated_settings:
                 payload['stop'] = validated_settings['stop']
             
-            # Make API request
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                return data['choices'][0]['message']['content']
-            else:
-                error_data = response.json()
-                error_msg = error_data.get('error', {}).get('message', f'HTTP {response.status_code}')
-                raise Exception(f"Groq API error: {error_msg}")
+            data = self._post_json(self._completions_url, payload)
+            choices = sorted(data['choices'], key=lambda choice: choice['index'])
+            return [choice['text'] for choice in choices]
                         
         except requests.exceptions.Timeout:
-            return self.handle_error(Exception("Request timeout"), "API call")
+            return [self.handle_error(Exception("Request timeout"), "API call")] * len(messages)
         except requests.exceptions.RequestException as e:
-            return self.handle_error(e, "network request")
-        except json.JSONDecodeError as e:
-            return self.handle_error(e, "response parsing")
+            return [self.handle_error(e, "network request")] * len(messages)
+        except orjson.JSONDecodeError as e:
+            return [self.handle_error(e, "response parsing")] * len(messages)
         except Exception as e:
-            return self.handle_error(e, "generate_response")
-    
-    def validate_settings(self, settings: Dict[str, Any]) -> Dict[str, Any]:
-        """Validate settings specific to Groq models"""
-        validated = super().validate_settings(settings)
-        
-        # Groq-specific max tokens limits
-        max_tokens = validated.get('max_tokens', 2048)
-        validated['max_tokens'] = min(max_tokens, 8192)  # Groq limit
-        
-        # Groq doesn't support presence_penalty, frequency_penalty, or seed
-        validated.pop('presence_penalty', None)
-        validated.pop('frequency_penalty', None)
-        validated.pop('seed', None)
-        
-        return validated
\ No newline at end of file
+            return [self.handle_error(e, "generate_batch")] * len(messages)
\ No newline at end of file
@@ -1,139 +1,235 @@
 """
 Hugging Face API handler for open-source models
-Handles communication with Hugging Face's Inference API endpoints.
+Handles communication with Hugging Face's Inference API endpoints, or with a
+self-hosted text-generation-inference / vLLM server when HF_INFERENCE_URL is set.
 """
 
+import os
+import orjson
 import requests
-import json
-from typing import Dict, Any, List
+from types import MappingProxyType
+from typing import Dict, Any, List, Optional, Tuple
 from .base_handler import BaseHandler
 
 class HuggingFaceHandler(BaseHandler):
     """Handler for Hugging Face models"""
     
+    api_name = 'Hugging Face'
+    
+    MAX_TOKENS_CAP = 1024  # Conservative limit for HF
+    # Hugging Face doesn't support presence_penalty, frequency_penalty, or seed
+    UNSUPPORTED_PARAMS = frozenset({'presence_penalty', 'frequency_penalty', 'seed'})
+    
+    # Default models for different categories
+    DEFAULT_MODELS = MappingProxyType({
+        'text-generation': 'microsoft/DialoGPT-large',
+        'conversational': 'microsoft/DialoGPT-large',
+        'chat': 'HuggingFaceH4/zephyr-7b-beta'
+    })
+    
+    # Frontend sender -> speaker label in the plain-text transcript
+    TRANSCRIPT_ROLES = {'user': 'Human', 'assistant': 'Assistant', 'bot': 'Assistant'}
+    
     def __init__(self, api_key: str):
         super().__init__(api_key)
         self.base_url = "https://api-inference.huggingface.co/models"
-        # Default models for different categories
-        self.default_models = {
-            'text-generation': 'microsoft/DialoGPT-large',
-            'conversational': 'microsoft/DialoGPT-large',
-            'chat': 'HuggingFaceH4/zephyr-7b-beta'
+        # Self-hosted TGI/vLLM server speaking the OpenAI-compatible API; gets
+        # continuous batching across concurrent callers and, when the server
+        # enables it, speculative decoding
+        self.inference_url = os.getenv('HF_INFERENCE_URL', '').rstrip('/')
+        self.inference_model = os.getenv('HF_INFERENCE_MODEL', self.DEFAULT_MODELS['chat'])
+        self._chat_url = f"{self.inference_url}/v1/chat/completions"
+        self._model_urls: Dict[str, str] = {}
+    
+    def _default_headers(self) -> Dict[str, str]:
+        """Static headers sent with every Hugging Face request"""
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
         }
     
-    def generate_response(
+    def _prepare_request(
         self, 
         model: str, 
         message: str, 
         settings: Dict[str, Any], 
-        conversation_history: List[Dict[str, str]]
+        conversation_history: List[Dict[str, str]],
+        session_id: Optional[str] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Build the inference request for Hugging Face Inference API"""
+        if self.inference_url:
+            return self._prepare_chat_request(message, settings, conversation_history, session_id)
+        
+        # Use a default chat model for now
+        api_model = self.DEFAULT_MODELS['chat']
+        
+        # Format the conversation for Hugging Face
+        formatted_input = self._format_hf_input(
+            conversation_history, 
+            message,
+            settings.get('system_prompt'),
+            session_id
+        )
+        
+        # Prepare request payload
+        payload = {
+            'inputs': formatted_input,
+            'parameters': {
+                'temperature': settings.get('temperature', 0.7),
+                'max_new_tokens': settings.get('max_tokens', 512),  # HF uses max_new_tokens
+                'top_p': settings.get('top_p', 1.0),
+                'do_sample': True,
+                'return_full_text': False
+            }
+        }
+        
+        # Add stop sequences if provided
+        if 'stop' in settings:
+            payload['parameters']['stop_sequences'] = settings['stop']
+        
+        return self._model_url(api_model), payload
+    
+    def _model_url(self, api_model: str) -> str:
+        """Inference endpoint for a hosted model, built once per model"""
+        url = self._model_urls.get(api_model)
+        if url is None:
+            url = self._model_urls[api_model] = f"{self.base_url}/{api_model}"
+        return url
+    
+    def _prepare_chat_request(
+        self, 
+        message: str, 
+        settings: Dict[str, Any], 
+        conversation_history: List[Dict[str, str]],
+        session_id: Optional[str] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Build an OpenAI-compatible chat completions request for a self-hosted server"""
+        messages = self._chat_messages(
+            conversation_history, 
+            message,
+            settings.get('system_prompt'),
+            session_id
+        )
+        
+        payload = {
+            'model': self.inference_model,
+            'messages': messages,
+            'temperature': settings.get('temperature', 0.7),
+            'max_tokens': settings.get('max_tokens', 512),
+            'top_p': settings.get('top_p', 1.0),
+            'stream': False
+        }
+        
+        if 'stop' in settings:
+            payload['stop'] = settings['stop']
+        
+        return self._chat_url, payload
+    
+    def _parse_response(self, data: Any) -> str:
+        """Extract the generated text from a Hugging Face response"""
+        if self.inference_url:
+            return data['choices'][0]['message']['content']
+        
+        if isinstance(data, list) and len(data) > 0:
+            return data[0].get('generated_text', '').strip()
+        elif isinstance(data, dict):
+            return data.get('generated_text', '').strip()
+        else:
+            raise Exception("Unexpected response format")
+    
+    def _parse_error(self, data: Any, status_code: int) -> str:
+        """Extract the error message from a Hugging Face, TGI or vLLM error body"""
+        error = data.get('error') or data.get('message')
+        if isinstance(error, dict):
+            error = error.get('message')
+        return error or f'HTTP {status_code}'
+    
+    def _parse_stream_event(self, event: Dict[str, Any]) -> Optional[str]:
+        """Extract the token text from a Hugging Face streaming event"""
+        if self.inference_url:
+            choices = event.get('choices')
+            return choices[0].get('delta', {}).get('content') if choices else None
+        
+        token = event.get('token', {})
+        if token.get('special'):
+            return None
+        return token.get('text')
+    
+    def _format_hf_input(
+        self, 
+        conversation_history: List[Dict[str, str]], 
+        current_message: str,
+        system_prompt: str = None,
+        session_id: Optional[str] = None
     ) -> str:
-        """Generate response using Hugging Face Inference API"""
+        """Format conversation for Hugging Face models"""
+        history = self._formatted_history(conversation_history, session_id)
+        
+        # System prompt if provided, the history, then the current message
+        # with an open Assistant turn; joined in a single pass
+        system = [f"System: {system_prompt}"] if system_prompt else []
+        return "\n".join([*system, *history, f"Human: {current_message}", "Assistant:"])
+    
+    def _format_history_message(self, msg: Dict[str, str]) -> Optional[Any]:
+        """Convert one conversation message to a transcript line (or chat message when self-hosted)"""
+        if self.inference_url:
+            return super()._format_history_message(msg)
+        
+        speaker = self.TRANSCRIPT_ROLES.get(msg.get('sender', 'user'))
+        if speaker:
+            return f"{speaker}: {msg.get('content', '')}"
+        return None
+    
+    def generate_batch(
+        self, 
+        model: str, 
+        messages: List[str], 
+        settings: Dict[str, Any]
+    ) -> List[str]:
+        """
+        Generate responses for several prompts in one request
+        
+        The Inference API accepts a list of inputs and returns outputs
+        aligned with them. A self-hosted server batches concurrent requests
+        itself, so there the prompts are simply sent in parallel. Returns one
+        response per prompt, in order.
+        """
+        if self.inference_url:
+            return self.generate_responses_parallel([(model, message, settings, []) for message in messages])
+        
         try:
             # Validate and normalize settings
             validated_settings = self.validate_settings(settings)
             
-            # Use a default chat model for now
-            api_model = self.default_models['chat']
+            api_model = self.DEFAULT_MODELS['chat']
+            system_prompt = validated_settings.get('system_prompt')
             
-            # Format the conversation for Hugging Face
-            formatted_input = self._format_hf_input(
-                conversation_history, 
-                message,
-                validated_settings.get('system_prompt')
-            )
-            
-            # Prepare request payload
             payload = {
-                'inputs': formatted_input,
+                'inputs': [self._format_hf_input([], message, system_prompt) for message in messages],
                 'parameters': {
                     'temperature': validated_settings.get('temperature', 0.7),
-                    'max_new_tokens': validated_settings.get('max_tokens', 512),  # HF uses max_new_tokens
+                    'max_new_tokens': validated_settings.get('max_tokens', 512),
                     'top_p': validated_settings.get('top_p', 1.0),
                     'do_sample': True,
                     'return_full_text': False
                 }
             }
             
-            # Add stop sequences if provided
             if 'stop' in validated_settings:
                 payload['parameters']['stop_sequences'] = validated_settings['stop']
             
-            # Make API request
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
+            data = self._post_json(self._model_url(api_model), payload)
+            if not isinstance(data, list) or len(data) != len(messages):
+                raise Exception("Unexpected response format")
             
-            response = requests.post(
-                f"{self.base_url}/{api_model}",
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if isinstance(data, list) and len(data) > 0:
-                    return data[0].get('generated_text', '').strip()
-                elif isinstance(data, dict):
-                    return data.get('generated_text', '').strip()
-                else:
-                    raise Exception("Unexpected response format")
-            else:
-                error_data = response.json()
-                error_msg = error_data.get('error', f'HTTP {response.status_code}')
-                raise Exception(f"Hugging Face API error: {error_msg}")
+            # Each output is either a dict or a single-element list of dicts
+            return [self._parse_response(output) for output in data]
                         
         except requests.exceptions.Timeout:
-            return self.handle_error(Exception("Request timeout"), "API call")
+            return [self.handle_error(Exception("Request timeout"), "API call")] * len(messages)
         except requests.exceptions.RequestException as e:
-            return self.handle_error(e, "network request")
-        except json.JSONDecodeError as e:
-            return self.handle_error(e, "response parsing")
+            return [self.handle_error(e, "network request")] * len(messages)
+        except orjson.JSONDecodeError as e:
+            return [self.handle_error(e, "response parsing")] * len(messages)
         except Exception as e:
-            return self.handle_error(e, "generate_response")
-    
-    def _format_hf_input(
-        self, 
-        conversation_history: List[Dict[str, str]], 
-        current_message: str,
-        system_prompt: str = None
-    ) -> str:
-        """Format conversation for Hugging Face models"""
-        formatted_parts = []
-        
-        # Add system prompt if provided
-        if system_prompt:
-            formatted_parts.append(f"System: {system_prompt}")
-        
-        # Add conversation history
-        for msg in conversation_history:
-            role = msg.get('sender', 'user')
-            content = msg.get('content', '')
-            
-            if role == 'user':
-                formatted_parts.append(f"Human: {content}")
-            elif role == 'assistant' or role == 'bot':
-                formatted_parts.append(f"Assistant: {content}")
-        
-        # Add current message
-        formatted_parts.append(f"Human: {current_message}")
-        formatted_parts.append("Assistant:")
-        
-        return "\n".join(formatted_parts)
-    
-    def validate_settings(self, settings: Dict[str, Any]) -> Dict[str, Any]:
-        """Validate settings specific to Hugging Face models"""
-        validated = super().validate_settings(settings)
-        
-        # Hugging Face-specific max tokens limits (usually smaller)
-        max_tokens = validated.get('max_tokens', 512)
-        validated['max_tokens'] = min(max_tokens, 1024)  # Conservative limit for HF
-        
-        # Hugging Face doesn't support presence_penalty, frequency_penalty, or seed
-        validated.pop('presence_penalty', None)
-        validated.pop('frequency_penalty', None)
-        validated.pop('seed', None)
-        
-        return validated
\ No newline at end of file
+            return [self.handle_error(e, "generate_batch")] * len(messages)
\ No newline at end of file
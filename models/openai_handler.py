@@ -3,103 +3,84 @@ OpenAI API handler for GPT models
 Handles communication with OpenAI's API endpoints.
 """
 
-import requests
-import json
-from typing import Dict, Any, List
+from types import MappingProxyType
+from typing import Dict, Any, List, Optional, Tuple
 from .base_handler import BaseHandler
 
 class OpenAIHandler(BaseHandler):
     """Handler for OpenAI GPT models"""
     
+    api_name = 'OpenAI'
+    
+    MAX_TOKENS_CAP = 4096  # OpenAI limit
+    
+    MODEL_MAPPING = MappingProxyType({
+        'gpt-4o': 'gpt-4o',
+        'gpt-4-turbo': 'gpt-4-turbo-preview',
+        'gpt-4': 'gpt-4',
+        'gpt-3.5-turbo': 'gpt-3.5-turbo'
+    })
+    
     def __init__(self, api_key: str):
         super().__init__(api_key)
         self.base_url = "https://api.openai.com/v1"
-        self.model_mapping = {
-            'gpt-4o': 'gpt-4o',
-            'gpt-4-turbo': 'gpt-4-turbo-preview',
-            'gpt-4': 'gpt-4',
-            'gpt-3.5-turbo': 'gpt-3.5-turbo'
+        self._chat_url = f"{self.base_url}/chat/completions"
+    
+    def _default_headers(self) -> Dict[str, str]:
+        """Static headers sent with every OpenAI request"""
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
         }
     
-    def generate_response(
+    def _prepare_request(
         self, 
         model: str, 
         message: str, 
         settings: Dict[str, Any], 
-        conversation_history: List[Dict[str, str]]
-    ) -> str:
-        """Generate response using OpenAI API"""
-        try:
-            # Validate and normalize settings
-            validated_settings = self.validate_settings(settings)
-            
-            # Get the actual model name for OpenAI API
-            api_model = self.model_mapping.get(model, model)
-            
-            # Format messages
-            messages = self.format_conversation_history(
-                conversation_history, 
-                validated_settings.get('system_prompt')
-            )
-            
-            # Add current message
-            messages.append({'role': 'user', 'content': message})
-            
-            # Prepare request payload
-            payload = {
-                'model': api_model,
-                'messages': messages,
-                'temperature': validated_settings.get('temperature', 0.7),
-                'max_tokens': validated_settings.get('max_tokens', 2048),
-                'top_p': validated_settings.get('top_p', 1.0),
-                'presence_penalty': validated_settings.get('presence_penalty', 0.0),
-                'frequency_penalty': validated_settings.get('frequency_penalty', 0.0),
-                'stream': False
-            }
-            
-            # Add optional parameters
-            if 'stop' in validated_settings:
-                payload['stop'] = validated_settings['stop']
-            
-            if 'seed' in validated_settings:
-                payload['seed'] = validated_settings['seed']
-            
-            # Make API request
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                return data['choices'][0]['message']['content']
-            else:
-                error_data = response.json()
-                error_msg = error_data.get('error', {}).get('message', f'HTTP {response.status_code}')
-                raise Exception(f"OpenAI API error: {error_msg}")
-                        
-        except requests.exceptions.Timeout:
-            return self.handle_error(Exception("Request timeout"), "API call")
-        except requests.exceptions.RequestException as e:
-            return self.handle_error(e, "network request")
-        except json.JSONDecodeError as e:
-            return self.handle_error(e, "response parsing")
-        except Exception as e:
-            return self.handle_error(e, "generate_response")
-    
-    def validate_settings(self, settings: Dict[str, Any]) -> Dict[str, Any]:
-        """Validate settings specific to OpenAI models"""
-        validated = super().validate_settings(settings)
+        conversation_history: List[Dict[str, str]],
+        session_id: Optional[str] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Build the chat completions request for OpenAI API"""
+        # Get the actual model name for OpenAI API
+        api_model = self.MODEL_MAPPING.get(model, model)
         
-        # OpenAI-specific max tokens limits
-        max_tokens = validated.get('max_tokens', 2048)
-        validated['max_tokens'] = min(max_tokens, 4096)  # OpenAI limit
+        # Format messages, ending with the current one
+        messages = self._chat_messages(
+            conversation_history, 
+            message,
+            settings.get('system_prompt'),
+            session_id
+        )
         
-        return validated
\ No newline at end of file
+        # Prepare request payload
+        payload = {
+            'model': api_model,
+            'messages': messages,
+            'temperature': settings.get('temperature', 0.7),
+            'max_tokens': settings.get('max_tokens', 2048),
+            'top_p': settings.get('top_p', 1.0),
+            'presence_penalty': settings.get('presence_penalty', 0.0),
+            'frequency_penalty': settings.get('frequency_penalty', 0.0),
+            'stream': False
+        }
+        
+        # Add optional parameters
+        if 'stop' in settings:
+            payload['stop'] = settings['stop']
+        
+        if 'seed' in settings:
+            payload['seed'] = settings['seed']
+        
+        return self._chat_url, payload
+    
+    def _parse_response(self, data: Dict[str, Any]) -> str:
+        """Extract the completion text from an OpenAI response"""
+        return data['choices'][0]['message']['content']
+    
+    def _parse_stream_event(self, event: Dict[str, Any]) -> Optional[str]:
+        """Extract the text delta from an OpenAI streaming chunk"""
+        choices = event.get('choices')
+        if choices:
+            return choices[0].get('delta', {}).get('content')
+        return None
\ No newline at end of file
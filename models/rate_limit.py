@@ -0,0 +1,45 @@
+"""
+Rate limiting for LLM Playground Backend
+Token bucket used to keep provider calls under request-per-minute ceilings.
+"""
+
+import asyncio
+import threading
+import time
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` calls per `period` seconds"""
+    
+    def __init__(self, rate: int, period: float = 60.0):
+        self.capacity = float(rate)
+        self._tokens = float(rate)
+        self._fill_rate = rate / period
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _try_acquire(self) -> float:
+        """Consume a token and return 0, or return the seconds until one is available"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._fill_rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self._fill_rate
+    
+    def acquire(self) -> None:
+        """Block until a call is allowed, then consume one token"""
+        while True:
+            wait = self._try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+    
+    async def aacquire(self) -> None:
+        """Async variant of acquire; waits without blocking the event loop"""
+        while True:
+            wait = self._try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
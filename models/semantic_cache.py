@@ -0,0 +1,110 @@
+"""
+Semantic response cache for LLM Playground Backend
+Serves a cached response when a prompt is a close paraphrase of one already
+answered in the same context ("what is 2+2?" / "what is two plus two?").
+
+Optional: requires sentence-transformers and faiss-cpu, and is enabled
+with LLM_SEMANTIC_CACHE=true.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import faiss
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+class SemanticCache:
+    """
+    Thread-safe nearest-neighbour cache over embeddings of the user message
+    
+    Entries are grouped by namespace, a hash of everything else that shapes
+    the reply (provider, model, settings, history), so a paraphrase only hits
+    when it would be sent in the same context. Each namespace has its own
+    inner-product index over normalized embeddings, i.e. cosine similarity.
+    Least recently used namespaces are dropped once the cache holds more
+    than maxsize entries.
+    """
+    
+    def __init__(
+        self,
+        model_name: str = 'all-MiniLM-L6-v2',
+        threshold: float = 0.97,
+        maxsize: int = 10_000
+    ):
+        if faiss is None:
+            raise ImportError("semantic cache requires sentence-transformers and faiss-cpu")
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self._embedder = SentenceTransformer(model_name)
+        self._dim = self._embedder.get_sentence_embedding_dimension()
+        # namespace -> (faiss index, responses in index order)
+        self._namespaces = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def embed(self, text: str) -> Any:
+        """Normalized float32 embedding of text, shaped (1, dim) for faiss"""
+        vector = self._embedder.encode([text], normalize_embeddings=True)
+        return np.asarray(vector, dtype='float32')
+    
+    def lookup(self, namespace: str, text: str) -> Tuple[Optional[str], Any]:
+        """
+        Return (cached response or None, embedding of text)
+        
+        The embedding is handed back so a miss can be stored with add()
+        without encoding the prompt a second time.
+        """
+        embedding = self.embed(text)
+        with self._lock:
+            entry = self._namespaces.get(namespace)
+            if entry is not None:
+                scores, ids = entry[0].search(embedding, 1)
+                if scores[0][0] >= self.threshold:
+                    self._namespaces.move_to_end(namespace)
+                    self.hits += 1
+                    logger.debug("semantic_hit score=%.3f", scores[0][0])
+                    return entry[1][ids[0][0]], embedding
+            self.misses += 1
+        return None, embedding
+    
+    def add(self, namespace: str, embedding: Any, response: str) -> None:
+        """Store a response under the embedding returned by lookup()"""
+        with self._lock:
+            entry = self._namespaces.get(namespace)
+            if entry is None:
+                entry = self._namespaces[namespace] = (faiss.IndexFlatIP(self._dim), [])
+            elif len(entry[1]) >= self.maxsize:
+                return
+            else:
+                self._namespaces.move_to_end(namespace)
+            entry[0].add(embedding)
+            entry[1].append(response)
+            self._size += 1
+            while self._size > self.maxsize:
+                _, (index, _) = self._namespaces.popitem(last=False)
+                self._size -= index.ntotal
+    
+    def clear(self) -> None:
+        """Drop every cached response"""
+        with self._lock:
+            self._namespaces.clear()
+            self._size = 0
+    
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size, for monitoring"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': self._size
+            }
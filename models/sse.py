@@ -0,0 +1,74 @@
+"""
+Server-sent events decoding for streaming responses
+Incremental parser that turns raw response chunks into event data payloads.
+"""
+
+import re
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, List, Optional
+
+# An event ends at a blank line; providers use either LF or CRLF line endings
+_EVENT_BOUNDARY = re.compile(rb'\r?\n\r?\n')
+
+class SSEDecoder:
+    """
+    Incremental SSE decoder
+    
+    Raw chunks are accumulated in a single bytearray and split on event
+    boundaries; only the data: payload of each complete event is copied
+    out, still as bytes, ready for orjson.loads.
+    """
+    
+    def __init__(self):
+        self._buffer = bytearray()
+    
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Add a chunk and return the data payloads of any events it completes"""
+        buffer = self._buffer
+        buffer += chunk
+        
+        events = []
+        start = 0
+        while True:
+            match = _EVENT_BOUNDARY.search(buffer, start)
+            if not match:
+                break
+            data = self._event_data(buffer[start:match.start()])
+            if data is not None:
+                events.append(data)
+            start = match.end()
+        
+        if start:
+            del buffer[:start]
+        return events
+    
+    def flush(self) -> List[bytes]:
+        """Return the payload of a final event that was not followed by a blank line"""
+        data = self._event_data(self._buffer)
+        self._buffer = bytearray()
+        return [data] if data is not None else []
+    
+    @staticmethod
+    def _event_data(frame: bytearray) -> Optional[bytes]:
+        """Join the data: lines of one event, or None if it has none (comments, event: only)"""
+        lines = [
+            line[5:].strip()
+            for line in bytes(frame).split(b'\n')
+            if line.startswith(b'data:')
+        ]
+        return b'\n'.join(lines) if lines else None
+
+def iter_sse_data(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Yield the data payload of each event in a stream of raw chunks"""
+    decoder = SSEDecoder()
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+    yield from decoder.flush()
+
+async def aiter_sse_data(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Async counterpart of iter_sse_data"""
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        for data in decoder.feed(chunk):
+            yield data
+    for data in decoder.flush():
+        yield data
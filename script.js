@@ -13,6 +13,8 @@ class LLMPlayground {
             systemPrompt: ''
         };
         this.conversationHistory = [];
+        // Identifies this conversation so the backend can reuse formatted history
+        this.sessionId = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
         this.isSettingsOpen = false;
         this.isFirstMessage = true;
         this.sliderUpdateTimeouts = {};
@@ -369,10 +371,25 @@ class LLMPlayground {
         const typingId = this.showTypingIndicator();
         
         try {
-            // Simulate API call (replace with actual API integration)
-            const response = await this.callLLMAPI(message);
+            // Render tokens as they arrive; the bubble replaces the typing
+            // indicator on the first delta
+            let messageContent = null;
+            const response = await this.callLLMAPIStream(message, (delta) => {
+                if (!messageContent) {
+                    this.removeTypingIndicator(typingId);
+                    messageContent = this.addMessage('', 'assistant', false, false);
+                }
+                messageContent.textContent += delta;
+                this.scrollToBottom(false);
+            });
             this.removeTypingIndicator(typingId);
-            this.addMessage(response, 'assistant');
+            if (messageContent) {
+                // The final text is authoritative (e.g. an error cut the stream short)
+                messageContent.textContent = response;
+                this.conversationHistory.push({ sender: 'assistant', content: response, timestamp: new Date() });
+            } else {
+                this.addMessage(response, 'assistant');
+            }
             
             // Ensure input remains visible and focused after response
             this.ensureInputVisibility();
@@ -400,18 +417,18 @@ class LLMPlayground {
         }, 100);
     }
     
-    async callLLMAPI(message) {
+    async callLLMAPIStream(message, onDelta) {
         try {
-            // Prepare request payload
             const requestData = {
                 message: message,
                 model: this.currentModel,
                 settings: this.settings,
-                conversation_history: this.conversationHistory
+                conversation_history: this.conversationHistory,
+                session_id: this.sessionId
             };
 
-            // Make API request to backend
-            const response = await fetch('http://localhost:5001/api/chat', {
+            // Server-sent events over a POST body (EventSource can only GET)
+            const response = await fetch('http://localhost:5001/api/chat/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -419,39 +436,69 @@ class LLMPlayground {
                 body: JSON.stringify(requestData)
             });
 
-            const data = await response.json();
+            // Requests rejected before streaming starts get a JSON error body
+            const contentType = response.headers.get('Content-Type') || '';
+            if (!contentType.includes('text/event-stream')) {
+                const data = await response.json();
+                throw new Error(this.describeAPIError(data));
+            }
 
-            if (data.success) {
-                return data.response;
-            } else {
-                // Handle different types of errors
-                let errorMessage = data.error || 'Unknown error occurred';
-                
-                if (data.error_type === 'validation_error') {
-                    errorMessage = `Validation Error: ${data.error}`;
-                } else if (data.error_type === 'provider_unavailable') {
-                    errorMessage = `Provider Unavailable: ${data.error}`;
-                } else if (data.error_type === 'server_error') {
-                    errorMessage = `Server Error: ${data.error}`;
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let text = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const frame = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    if (!frame.startsWith('data: ')) continue;
+
+                    const payload = frame.slice(6);
+                    if (payload === '[DONE]') return text;
+
+                    const delta = JSON.parse(payload).delta;
+                    text += delta;
+                    onDelta(delta);
                 }
-                
-                throw new Error(errorMessage);
             }
+            return text;
         } catch (error) {
-            // Handle network errors and other exceptions
-            if (error.name === 'TypeError' && error.message.includes('fetch')) {
-                return `Connection Error: Unable to connect to the backend server. Please ensure the Python backend is running on http://localhost:5001`;
-            } else if (error.message.includes('rate limit')) {
-                return `Rate Limit: ${error.message}`;
-            } else if (error.message.includes('API key') || error.message.includes('unauthorized')) {
-                return `Authentication Error: ${error.message}`;
-            } else {
-                return `Error: ${error.message}`;
-            }
+            return this.describeRequestError(error);
+        }
+    }
+    
+    describeAPIError(data) {
+        // Handle different types of errors
+        if (data.error_type === 'validation_error') {
+            return `Validation Error: ${data.error}`;
+        } else if (data.error_type === 'provider_unavailable' || data.error_type === 'provider_circuit_open') {
+            return `Provider Unavailable: ${data.error}`;
+        } else if (data.error_type === 'server_error') {
+            return data.request_id ? `Server Error: ${data.error} (request ${data.request_id})` : `Server Error: ${data.error}`;
         }
+        return data.error || 'Unknown error occurred';
     }
     
-    addMessage(content, sender, isError = false) {
+    describeRequestError(error) {
+        // Handle network errors and other exceptions
+        if (error.name === 'TypeError' && error.message.includes('fetch')) {
+            return `Connection Error: Unable to connect to the backend server. Please ensure the Python backend is running on http://localhost:5001`;
+        } else if (error.message.includes('rate limit')) {
+            return `Rate Limit: ${error.message}`;
+        } else if (error.message.includes('API key') || error.message.includes('unauthorized')) {
+            return `Authentication Error: ${error.message}`;
+        } else {
+            return `Error: ${error.message}`;
+        }
+    }
+    
+    addMessage(content, sender, isError = false, record = true) {
         // Remove welcome message if it exists
         const welcomeMessage = document.querySelector('.welcome-message');
         if (welcomeMessage) {
@@ -486,7 +533,11 @@ class LLMPlayground {
         }, 100);
         
         // Add to conversation history
-        this.conversationHistory.push({ sender, content, timestamp: new Date() });
+        if (record) {
+            this.conversationHistory.push({ sender, content, timestamp: new Date() });
+        }
+        
+        return messageContent;
     }
     
     showTypingIndicator() {
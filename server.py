@@ -4,244 +4,531 @@ LLM Playground Backend Server
 Handles API requests to various AI models using environment variables for secure key management.
 """
 
+import asyncio
 import os
 import json
 import logging
-from typing import Dict, Any, Optional
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+import random
+import uuid
+from contextvars import ContextVar
+from types import MappingProxyType
+from typing import Annotated, Dict, Any, AsyncIterator, List, Optional, Tuple
+import msgspec
+import orjson
+from quart import Quart, request, jsonify, make_response
+from quart.json.provider import DefaultJSONProvider
+from quart_cors import cors
 from dotenv import load_dotenv
 
-# Import model handlers
-from models.openai_handler import OpenAIHandler
-from models.anthropic_handler import AnthropicHandler
-from models.google_handler import GoogleHandler
-from models.groq_handler import GroqHandler
-from models.huggingface_handler import HuggingFaceHandler
+# Import model handlers; the package loads each handler module on first use
+import models
+from models.cache import LLMCache
+from models.circuit_breaker import CircuitOpenError
 
 # Load environment variables from .env file
 current_dir = os.path.dirname(os.path.abspath(__file__))
 env_path = os.path.join(current_dir, '.env')
 load_dotenv(env_path)
 
+# Id of the request being served; returned to clients with internal errors
+# and stamped on every log line so the two can be matched up
+request_id_var: ContextVar[str] = ContextVar('request_id', default='-')
+
+class RequestIdFilter(logging.Filter):
+    """Add the current request id to each log record as record.request_id"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:[%(request_id)s] %(message)s')
+for log_handler in logging.getLogger().handlers:
+    log_handler.addFilter(RequestIdFilter())
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for frontend communication
+class SamplingFilter(logging.Filter):
+    """Pass a random fraction of records below WARNING; warnings and errors always pass"""
+    
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+# Per-request logs are sampled (LOG_SAMPLE_RATE, default 1%) so they stay
+# cheap under load while still showing what traffic looks like
+request_logger = logging.getLogger(f'{__name__}.requests')
+request_logger.addFilter(SamplingFilter(float(os.getenv('LOG_SAMPLE_RATE', '0.01'))))
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson for request parsing and jsonify responses"""
+    
+    # Match the stdlib encoder, which accepts int/None dict keys
+    option = orjson.OPT_NON_STR_KEYS
+    
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+    
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+    
+    def response(self, *args: Any, **kwargs: Any):
+        # Hand orjson's bytes straight to the response, skipping the str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self.option),
+            mimetype=self.mimetype
+        )
+
+# Quart keeps the Flask API but serves requests on one event loop, so a
+# worker can have many slow LLM calls in flight instead of one per thread
+app = Quart(__name__)
+app.json = OrjsonProvider(app)
+app = cors(app, allow_origin='*')  # Enable CORS for frontend communication
+
+# Model name -> provider. Immutable and shared: membership checks use the
+# frozenset, and the tuple is reused in error messages and listings
+SUPPORTED_MODELS = MappingProxyType({
+    # OpenAI Models
+    'gpt-4o': 'openai',
+    'gpt-4-turbo': 'openai',
+    'gpt-4': 'openai',
+    'gpt-3.5-turbo': 'openai',
+    
+    # Anthropic Claude Models
+    'claude-3-5-sonnet': 'anthropic',
+    'claude-3-5-haiku': 'anthropic',
+    'claude-3-opus': 'anthropic',
+    'claude-3-haiku': 'anthropic',
+    
+    # Google Gemini Models
+    'gemini-2.5-pro': 'google',
+    'gemini-2.5-flash': 'google',
+    'gemini-2.5-flash-lite': 'google',
+    'gemini-1.0-ultra': 'google',
+    'gemini-pro': 'google',
+    
+    # xAI Grok Models (via Groq for now)
+    'grok-4-fast': 'groq',
+    'grok-4': 'groq',
+    'grok-2': 'groq',
+    'grok-2-mini': 'groq',
+})
+SUPPORTED_MODEL_KEYS = frozenset(SUPPORTED_MODELS)
+SUPPORTED_MODELS_LIST = tuple(SUPPORTED_MODELS)
+
+class ChatRequest(msgspec.Struct):
+    """Body of /api/chat and /api/chat/stream, type-checked while it is decoded"""
+    message: str
+    model: str
+    settings: Dict[str, Any] = msgspec.field(default_factory=dict)
+    conversation_history: List[Dict[str, Any]] = msgspec.field(default_factory=list)
+    session_id: Optional[str] = None
+
+class CompareRequest(msgspec.Struct):
+    """Body of /api/chat/compare: a ChatRequest naming several models"""
+    message: str
+    models: Annotated[List[str], msgspec.Meta(min_length=1, max_length=len(SUPPORTED_MODELS))]
+    settings: Dict[str, Any] = msgspec.field(default_factory=dict)
+    conversation_history: List[Dict[str, Any]] = msgspec.field(default_factory=list)
+    session_id: Optional[str] = None
 
 class LLMBackend:
     """Main backend class for handling LLM API requests"""
     
+    __slots__ = (
+        'cache', 'semantic_cache', 'handler_factories', 'model_handlers',
+        'supported_models', 'model_to_handler'
+    )
+    
     def __init__(self):
-        self.model_handlers = self._initialize_handlers()
-        self.supported_models = self._get_supported_models()
+        # One response cache for every provider; handlers consult it before
+        # dispatch for deterministic calls (temperature 0 or a fixed seed)
+        self.cache = LLMCache(
+            maxsize=int(os.getenv('LLM_CACHE_SIZE', '10000')),
+            ttl=float(os.getenv('LLM_CACHE_TTL', '3600'))
+        )
+        self.semantic_cache = self._create_semantic_cache()
+        # provider -> (handler class name, API key) for configured providers;
+        # handlers are only built when a request first needs one
+        self.handler_factories = self._initialize_handler_factories()
+        self.model_handlers: Dict[str, models.BaseHandler] = {}
+        self.supported_models = SUPPORTED_MODELS
+        # model -> handler, filled as models are first used, so dispatch
+        # is a single lookup afterwards
+        self.model_to_handler: Dict[str, models.BaseHandler] = {}
         
-    def _initialize_handlers(self) -> Dict[str, Any]:
-        """Initialize all model handlers with their respective API keys"""
+    def _create_semantic_cache(self) -> Optional[Any]:
+        """Build the optional semantic cache when LLM_SEMANTIC_CACHE is enabled"""
+        if os.getenv('LLM_SEMANTIC_CACHE', 'False').lower() != 'true':
+            return None
+        try:
+            return models.SemanticCache(
+                model_name=os.getenv('LLM_SEMANTIC_CACHE_MODEL', 'all-MiniLM-L6-v2'),
+                threshold=float(os.getenv('LLM_SEMANTIC_CACHE_THRESHOLD', '0.97')),
+                maxsize=int(os.getenv('LLM_SEMANTIC_CACHE_SIZE', '10000'))
+            )
+        except ImportError as e:
+            logger.warning("Semantic cache disabled: %s", e)
+            return None
+        
+    def _initialize_handler_factories(self) -> Dict[str, Tuple[str, str]]:
+        """Read each provider's API key once and register a factory for those configured"""
         handlers = {}
         
         # OpenAI Handler
         openai_key = os.getenv('OPENAI_API_KEY')
         if openai_key:
-            handlers['openai'] = OpenAIHandler(openai_key)
-            logger.info("OpenAI handler initialized")
+            handlers['openai'] = ('OpenAIHandler', openai_key)
         else:
             logger.warning("OpenAI API key not found in environment variables")
             
         # Anthropic Handler
         anthropic_key = os.getenv('ANTHROPIC_API_KEY')
         if anthropic_key:
-            handlers['anthropic'] = AnthropicHandler(anthropic_key)
-            logger.info("Anthropic handler initialized")
+            handlers['anthropic'] = ('AnthropicHandler', anthropic_key)
         else:
             logger.warning("Anthropic API key not found in environment variables")
             
         # Google Handler
         google_key = os.getenv('GOOGLE_API_KEY')
         if google_key:
-            handlers['google'] = GoogleHandler(google_key)
-            logger.info("Google handler initialized")
+            handlers['google'] = ('GoogleHandler', google_key)
         else:
             logger.warning("Google API key not found in environment variables")
             
         # Groq Handler
         groq_key = os.getenv('GROQ_API_KEY')
         if groq_key:
-            handlers['groq'] = GroqHandler(groq_key)
-            logger.info("Groq handler initialized")
+            handlers['groq'] = ('GroqHandler', groq_key)
         else:
             logger.warning("Groq API key not found in environment variables")
             
         # Hugging Face Handler
         hf_token = os.getenv('HF_TOKEN')
-        if hf_token:
-            handlers['huggingface'] = HuggingFaceHandler(hf_token)
-            logger.info("Hugging Face handler initialized")
+        if hf_token or os.getenv('HF_INFERENCE_URL'):
+            # A self-hosted inference server may not require a token
+            handlers['huggingface'] = ('HuggingFaceHandler', hf_token or '')
         else:
             logger.warning("Hugging Face token not found in environment variables")
-            
+        
+        logger.info("Available providers: %s", ', '.join(handlers) or 'none')
         return handlers
     
-    def _get_supported_models(self) -> Dict[str, str]:
-        """Get mapping of model names to their respective providers"""
-        return {
-            # OpenAI Models
-            'gpt-4o': 'openai',
-            'gpt-4-turbo': 'openai',
-            'gpt-4': 'openai',
-            'gpt-3.5-turbo': 'openai',
-            
-            # Anthropic Claude Models
-            'claude-3-5-sonnet': 'anthropic',
-            'claude-3-5-haiku': 'anthropic',
-            'claude-3-opus': 'anthropic',
-            'claude-3-haiku': 'anthropic',
-            
-            # Google Gemini Models
-            'gemini-2.5-pro': 'google',
-            'gemini-2.5-flash': 'google',
-            'gemini-2.5-flash-lite': 'google',
-            'gemini-1.0-ultra': 'google',
-            'gemini-pro': 'google',
-            
-            # xAI Grok Models (via Groq for now)
-            'grok-4-fast': 'groq',
-            'grok-4': 'groq',
-            'grok-2': 'groq',
-            'grok-2-mini': 'groq',
-        }
+    def get_handler(self, model: str) -> models.BaseHandler:
+        """Handler serving a supported model whose provider is configured, built on first use"""
+        handler = self.model_to_handler.get(model)
+        if handler is None:
+            handler = self.model_to_handler[model] = self._provider_handler(self.supported_models[model])
+        return handler
+    
+    def _provider_handler(self, provider: str) -> models.BaseHandler:
+        """Instantiate a provider's handler the first time it is needed"""
+        handler = self.model_handlers.get(provider)
+        if handler is None:
+            class_name, api_key = self.handler_factories[provider]
+            handler = getattr(models, class_name)(api_key)
+            handler.cache = self.cache  # shared across providers
+            handler.semantic_cache = self.semantic_cache
+            self.model_handlers[provider] = handler
+        return handler
     
     def get_provider_for_model(self, model: str) -> Optional[str]:
         """Get the provider for a given model"""
         return self.supported_models.get(model)
     
-    def validate_request(self, data: Dict[str, Any]) -> tuple[bool, str]:
-        """Validate incoming request data"""
-        required_fields = ['message', 'model']
-        
-        for field in required_fields:
-            if field not in data:
-                return False, f"Missing required field: {field}"
-        
-        if not isinstance(data['message'], str) or not data['message'].strip():
+    def validate_request(self, req: ChatRequest) -> tuple[bool, str]:
+        """Validate what decoding into ChatRequest cannot (field types are already checked)"""
+        if not req.message.strip():
             return False, "Message must be a non-empty string"
         
-        if data['model'] not in self.supported_models:
-            return False, f"Unsupported model: {data['model']}. Supported models: {list(self.supported_models.keys())}"
+        if req.model not in SUPPORTED_MODEL_KEYS:
+            return False, f"Unsupported model: {req.model}. Supported models: {list(SUPPORTED_MODELS_LIST)}"
         
         return True, ""
     
-    def process_request(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Process the LLM request and return response"""
-        try:
-            # Validate request
-            is_valid, error_msg = self.validate_request(data)
-            if not is_valid:
-                return {
-                    'success': False,
-                    'error': error_msg,
-                    'error_type': 'validation_error'
-                }
-            
-            # Get model and provider
-            model = data['model']
-            provider = self.get_provider_for_model(model)
+    def check_request(self, req: ChatRequest) -> Optional[Dict[str, Any]]:
+        """Return the error result for a request that cannot be dispatched, or None"""
+        # Validate request
+        is_valid, error_msg = self.validate_request(req)
+        if not is_valid:
+            return {
+                'success': False,
+                'error': error_msg,
+                'error_type': 'validation_error'
+            }
+        
+        # A model that has been dispatched before maps straight to its
+        # handler; otherwise its provider must at least be configured
+        handler = self.model_to_handler.get(req.model)
+        if handler is None:
+            provider = self.get_provider_for_model(req.model)
             
-            if provider not in self.model_handlers:
+            if provider not in self.handler_factories:
                 return {
                     'success': False,
                     'error': f"Provider {provider} not available. Check API key configuration.",
                     'error_type': 'provider_unavailable'
                 }
             
-            # Extract parameters
-            message = data['message']
-            settings = data.get('settings', {})
-            conversation_history = data.get('conversation_history', [])
+            handler = self.model_handlers.get(provider)
+        
+        if handler is not None and handler.circuit_breaker.state == 'open':
+            return _circuit_open_error(handler.provider_name)
+        
+        return None
+    
+    async def process_request(self, req: ChatRequest) -> Dict[str, Any]:
+        """Process the LLM request and return response"""
+        try:
+            error = self.check_request(req)
+            if error:
+                return error
             
-            # Log settings for debugging
-            logger.info(f"Processing request with settings: {settings}")
+            handler = self.get_handler(req.model)
             
-            # Get handler and process request
-            handler = self.model_handlers[provider]
-            response = handler.generate_response(
-                model=model,
-                message=message,
-                settings=settings,
-                conversation_history=conversation_history
+            # Sampled, and formatted only for records that pass the filter
+            request_logger.info("Processing request with settings: %s", req.settings)
+            
+            # Process request
+            response = await handler.agenerate_response(
+                model=req.model,
+                message=req.message,
+                settings=req.settings,
+                conversation_history=req.conversation_history,
+                session_id=req.session_id
             )
             
             return {
                 'success': True,
                 'response': response,
-                'model': model,
-                'provider': provider
+                'model': req.model,
+                'provider': handler.provider_name
             }
             
-        except Exception as e:
-            logger.error(f"Error processing request: {str(e)}")
-            return {
-                'success': False,
-                'error': f"Internal server error: {str(e)}",
-                'error_type': 'server_error'
-            }
+        except CircuitOpenError:
+            # Lost the race for the half-open probe: same answer as an open circuit
+            return _circuit_open_error(handler.provider_name)
+        except Exception:
+            logger.exception("Error processing request")
+            return _internal_error()
+    
+    async def compare_request(self, req: CompareRequest) -> Dict[str, Any]:
+        """
+        Send one message to several models concurrently
+        
+        Each model gets its own process_request result, so one provider
+        failing or being unavailable does not affect the others; total
+        latency is that of the slowest model.
+        """
+        # Drop repeats while keeping the requested order
+        model_names = list(dict.fromkeys(req.models))
+        results = await asyncio.gather(*(
+            self.process_request(ChatRequest(
+                message=req.message,
+                model=model,
+                settings=req.settings,
+                conversation_history=req.conversation_history,
+                session_id=req.session_id
+            ))
+            for model in model_names
+        ))
+        
+        return {
+            'success': True,
+            'results': dict(zip(model_names, results))
+        }
+    
+    async def stream_request(self, req: ChatRequest) -> AsyncIterator[bytes]:
+        """
+        Relay a model's output as server-sent events
+        
+        Each text delta is sent as `data: {"delta": ...}` and the stream ends
+        with `data: [DONE]`. Call check_request first; provider errors arrive
+        as a delta carrying the handler's user-friendly message.
+        """
+        handler = self.get_handler(req.model)
+        
+        async for delta in handler.agenerate_response_stream(
+            model=req.model,
+            message=req.message,
+            settings=req.settings,
+            conversation_history=req.conversation_history,
+            session_id=req.session_id
+        ):
+            yield b'data: ' + orjson.dumps({'delta': delta}) + b'\n\n'
+        yield b'data: [DONE]\n\n'
+    
+    async def close(self) -> None:
+        """Close the pooled HTTP sessions held by every handler"""
+        for handler in self.model_handlers.values():
+            await handler.aclose()
+
+def _circuit_open_error(provider: str) -> Dict[str, Any]:
+    """Client payload for a provider whose circuit breaker is rejecting calls"""
+    return {
+        'success': False,
+        'error': f"Provider {provider} is temporarily unavailable after repeated failures. Please try again shortly.",
+        'error_type': 'provider_circuit_open'
+    }
+
+def _internal_error() -> Dict[str, Any]:
+    """Client payload for an unexpected failure; the details go to the log only"""
+    return {
+        'success': False,
+        'error': 'Internal server error',
+        'error_type': 'server_error',
+        'request_id': request_id_var.get()
+    }
+
+# HTTP status for each process_request error_type; anything else is a 500
+_ERROR_STATUS = {
+    'validation_error': 400,
+    'provider_unavailable': 400,  # model's provider has no API key configured
+    'provider_circuit_open': 503
+}
 
 # Initialize backend
 backend = LLMBackend()
 
+async def _decode_request(request_type: type) -> tuple[Any, Any]:
+    """
+    Decode and type-check the JSON body in one pass
+    
+    Returns (request, None), or (None, error response) when the body is
+    missing, is not JSON, or does not match request_type.
+    """
+    body = await request.get_data()
+    if not body:
+        return None, (jsonify({
+            'success': False,
+            'error': 'No JSON data provided',
+            'error_type': 'invalid_request'
+        }), 400)
+    
+    try:
+        return msgspec.json.decode(body, type=request_type), None
+    except msgspec.ValidationError as e:
+        return None, (jsonify({
+            'success': False,
+            'error': str(e),
+            'error_type': 'validation_error'
+        }), 400)
+    except msgspec.DecodeError:
+        return None, (jsonify({
+            'success': False,
+            'error': 'Request body is not valid JSON',
+            'error_type': 'invalid_request'
+        }), 400)
+
+@app.before_request
+async def assign_request_id():
+    """Give each request an id for its log lines and error responses"""
+    request_id_var.set(uuid.uuid4().hex)
+
+@app.after_request
+async def add_request_id_header(response):
+    """Echo the request id so clients can quote it when reporting problems"""
+    response.headers['X-Request-ID'] = request_id_var.get()
+    return response
+
+@app.after_serving
+async def shutdown():
+    """Release handler connection pools when the server stops"""
+    await backend.close()
+
 @app.route('/health', methods=['GET'])
-def health_check():
+async def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'available_providers': list(backend.model_handlers.keys()),
-        'supported_models': list(backend.supported_models.keys())
+        'available_providers': list(backend.handler_factories),
+        'supported_models': SUPPORTED_MODELS_LIST,
+        'cache': backend.cache.stats(),
+        'semantic_cache': backend.semantic_cache.stats() if backend.semantic_cache else None,
+        'circuits': {
+            provider: handler.circuit_breaker.state
+            for provider, handler in backend.model_handlers.items()
+        }
     })
 
 @app.route('/api/chat', methods=['POST'])
-def chat():
+async def chat():
     """Main chat endpoint for processing LLM requests"""
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({
-                'success': False,
-                'error': 'No JSON data provided',
-                'error_type': 'invalid_request'
-            }), 400
+        req, error_response = await _decode_request(ChatRequest)
+        if error_response:
+            return error_response
         
-        result = backend.process_request(data)
+        result = await backend.process_request(req)
         
         if result['success']:
             return jsonify(result), 200
         else:
-            status_code = 400 if result.get('error_type') == 'validation_error' else 500
+            status_code = _ERROR_STATUS.get(result.get('error_type'), 500)
             return jsonify(result), status_code
             
-    except Exception as e:
-        logger.error(f"Error in chat endpoint: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': f"Server error: {str(e)}",
-            'error_type': 'server_error'
-        }), 500
+    except Exception:
+        logger.exception("Error in chat endpoint")
+        return jsonify(_internal_error()), 500
+
+@app.route('/api/chat/compare', methods=['POST'])
+async def chat_compare():
+    """Compare endpoint: one message answered by several models side by side"""
+    try:
+        req, error_response = await _decode_request(CompareRequest)
+        if error_response:
+            return error_response
+        
+        result = await backend.compare_request(req)
+        
+        if result['success']:
+            return jsonify(result), 200
+        else:
+            return jsonify(result), _ERROR_STATUS.get(result.get('error_type'), 500)
+            
+    except Exception:
+        logger.exception("Error in compare endpoint")
+        return jsonify(_internal_error()), 500
+
+@app.route('/api/chat/stream', methods=['POST'])
+async def chat_stream():
+    """Streaming chat endpoint: relays the model's output as server-sent events"""
+    req, error_response = await _decode_request(ChatRequest)
+    if error_response:
+        return error_response
+    
+    # Requests that cannot be dispatched get the same JSON errors as /api/chat
+    error = backend.check_request(req)
+    if error:
+        return jsonify(error), _ERROR_STATUS.get(error['error_type'], 500)
+    
+    response = await make_response(
+        backend.stream_request(req),
+        200,
+        {
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # stop nginx from buffering the stream
+        }
+    )
+    response.timeout = None  # generations can outlast Quart's body timeout
+    return response
 
 @app.route('/api/models', methods=['GET'])
-def get_models():
+async def get_models():
     """Get list of supported models and their providers"""
     return jsonify({
-        'models': backend.supported_models,
-        'available_providers': list(backend.model_handlers.keys())
+        'models': dict(SUPPORTED_MODELS),
+        'available_providers': list(backend.handler_factories)
     })
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5001))
     debug = os.getenv('DEBUG', 'False').lower() == 'true'
     
-    logger.info(f"Starting LLM Playground Backend on port {port}")
-    logger.info(f"Available providers: {list(backend.model_handlers.keys())}")
+    logger.info("Starting LLM Playground Backend on port %s", port)
     
     app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file